@@ -10,25 +10,62 @@ Simply replace `lst = None` with the above two lines of code.
 
 The agent has a solve rate of 68.858% out of 1,000,000 random (but solvable) test cases. These test cases were conducted on 4x4 world's with 3 pits, 1 wumpus, 1 gold and 1 arrow for the agent.
 Solve rate will vary depending on world state.
+
+To reproduce the solve rate, run the agent headless over a batch of seeded worlds spread across every core:
+    python "Wumpus World.py" --batch 1000000
+See `python "Wumpus World.py" --help` for the world and pool options.
 """
 
-from random import randint
-from copy import deepcopy
-from time import sleep
+import gc
+import os
+import sys
+import json
+import math
+import zlib
+import mmap
+import hashlib
+import stat
+import struct
+import socket
+import tracemalloc
+import cProfile
+import random
+import statistics
+import argparse
+import socketserver
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+from functools import lru_cache
+from time import sleep, perf_counter
+from queue import Queue
+from threading import Thread
+from multiprocessing import Pool, cpu_count
+
+try:
+    import numpy as np # only needed for bulk world generation
+except ImportError:
+    np = None
 
 lst = None
 
+# Percepts as bit flags, used by the compact world backend and by Agent.check_percepts.
+STENCH, BREEZE, GLITTER = 1, 2, 4
+PERCEPT_BITS = {'S' : STENCH, 'B' : BREEZE, 'g' : GLITTER}
+
 class Node():
+    __slots__ = ('type', 'env') # a world holds one per cell, so no per-instance __dict__
+    
     def __init__(self, ntype='0', env=None):
         self.type = ntype
         if not env:
             self.env = list()
         else:
             self.env = env
-        self.markers = list()
-        self.score = float('-inf')
 
 class GraphNode():
+    __slots__ = ('pos', 'g', 'h', 'f', 'parent')
+    
     def __init__(self, pos, parent=None, g=0, h=0):
         self.pos = pos
         self.g = g
@@ -39,84 +76,441 @@ class GraphNode():
     def __str__(self):
         return 'Pos: ' + str(self.pos) + ' h: ' + str(self.h) + ' f: ' + str(self.f)
 
-class AugList(list):
-    def __init__(self, l):
-        list.__init__(self, l)
+class EpisodeOver(Exception):
+    '''Raised to unwind the agent's action loop once an episode has ended.'''
+    def __init__(self, result):
+        Exception.__init__(self, result)
+        self.result = result
+
+class Outcome():
+    '''Result of a single episode: 'solved', 'died' or 'stuck', along with the moves made and arrows used.'''
+    def __init__(self, result, steps, arrows_used):
+        self.result = result
+        self.steps = steps
+        self.arrows_used = arrows_used
+    
+    def as_dict(self):
+        return {'result' : self.result, 'steps' : self.steps, 'arrows_used' : self.arrows_used}
+    
+    def __repr__(self):
+        return 'Outcome(result=' + repr(self.result) + ', steps=' + str(self.steps) + ', arrows_used=' + str(self.arrows_used) + ')'
+
+class Profiler():
+    '''Wall time and call counts per phase of the agent's decision loop, plus counters such as A* nodes expanded.
+    
+    Attach one with Agent.instrument; an agent without a profiler pays nothing beyond a few `is None` checks.
+    Profilers from several episodes or worker processes can be summed with +=.'''
+    PHASES = ('check_percepts', 'update_knowledge', 'best_action', 'closest_node', 'find_path', 'follow_path')
+    
+    def __init__(self):
+        self.seconds = dict()
+        self.calls = dict()
+        self.counters = dict() # name -> [samples, total, max]
+        self.enabled = True # cleared while the agent plays something other than its episode, such as Lookahead rollouts
+    
+    def wrap(self, phase, method):
+        '''Returns `method` timed under the given phase while the profiler is enabled.'''
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return method(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[phase] = self.seconds.get(phase, 0.0) + perf_counter() - start
+                self.calls[phase] = self.calls.get(phase, 0) + 1
+        return timed
+    
+    def count(self, name, value):
+        counter = self.counters.get(name)
+        if counter is None:
+            self.counters[name] = [1, value, value]
+        else:
+            counter[0] += 1
+            counter[1] += value
+            if value > counter[2]:
+                counter[2] = value
+    
+    def __iadd__(self, other):
+        for phase in other.seconds:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + other.seconds[phase]
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        for name, (samples, total, maximum) in other.counters.items():
+            counter = self.counters.setdefault(name, [0, 0, maximum])
+            counter[0] += samples
+            counter[1] += total
+            counter[2] = max(counter[2], maximum)
+        return self
+    
+    def stats(self):
+        '''Returns the aggregated statistics as a JSON-serialisable dict.'''
+        return {
+            'phases' : {phase : {'calls' : self.calls[phase], 'seconds' : self.seconds[phase],
+                                 'mean_us' : self.seconds[phase] / self.calls[phase] * 1e6} for phase in self.seconds},
+            'counters' : {name : {'samples' : samples, 'total' : total, 'mean' : total / samples, 'max' : maximum}
+                          for name, (samples, total, maximum) in self.counters.items()}
+        }
+    
+    def to_json(self, indent=2):
+        return json.dumps(self.stats(), indent=indent)
+
+class Event():
+    '''Something the agent did, as emitted to its sink: the kind of action, the step it happened on, where, and any detail.
+    
+    Kinds are 'turn', 'move', 'bump', 'shoot', 'scream', 'miss', 'pickup', 'death' and 'escape'.'''
+    MESSAGES = {'move' : 'Moving to: {pos}', 'bump' : 'B U M P', 'shoot' : 'Shooting at: {pos}', 'scream' : 'Wumpus killed.',
+                'miss' : 'Wumpus missed.', 'pickup' : 'Picked up gold.', 'death' : 'Death', 'escape' : 'Escaped.'}
+    
+    def __init__(self, kind, step, pos=None, detail=None):
+        self.kind = kind
+        self.step = step
+        self.pos = pos
+        self.detail = detail
+    
+    def as_dict(self):
+        return {'kind' : self.kind, 'step' : self.step, 'pos' : self.pos, 'detail' : self.detail}
+    
+    def __str__(self):
+        if self.kind == 'turn':
+            return 'Turning ' + ('right' if self.detail[0] == 'R' else 'left') + '. Orientation: ' + self.detail[1]
+        return Event.MESSAGES[self.kind].format(pos=self.pos)
+
+class NullSink():
+    '''Discards every event. Agents without a sink skip emitting altogether; this is for code that wants a sink object.'''
+    def emit(self, event):
+        pass
+    
+    def close(self):
+        pass
+
+class PathRecorder():
+    '''Keeps the cells the agent moved into, in order.'''
+    def __init__(self):
+        self.path = list()
+    
+    def emit(self, event):
+        if event.kind == 'move':
+            self.path.append(event.pos)
+    
+    def close(self):
+        pass
+
+class ThrottledRenderer():
+    '''Prints every event and redraws the world after each move or kill, for demos.
+    
+    After a redraw it sleeps `delay` seconds so the run can be followed; redraws closer than `interval` seconds to the
+    previous one are skipped, which keeps fast runs watchable without flooding the terminal.'''
+    def __init__(self, world, delay=1.0, interval=0.0, out=None):
+        self.world = world
+        self.delay = delay
+        self.interval = interval
+        self.out = out or sys.stdout
+        self.last_render = float('-inf')
+    
+    def emit(self, event):
+        self.out.write(str(event) + '\n')
+        if event.kind in ('move', 'scream') and perf_counter() - self.last_render >= self.interval:
+            self.out.write(str(self.world) + '\n\n')
+            self.out.flush()
+            self.last_render = perf_counter()
+            if self.delay:
+                sleep(self.delay)
+    
+    def close(self):
+        self.out.flush()
+
+class BufferedLogSink():
+    '''Writes events as JSON lines to a file, `batch_size` events per write.'''
+    def __init__(self, out, batch_size=1024):
+        self.out = open(out, 'a') if isinstance(out, str) else out
+        self.owns_out = isinstance(out, str)
+        self.batch_size = batch_size
+        self.buffer = list()
+    
+    def emit(self, event):
+        self.buffer.append(event)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if self.buffer:
+            self.out.write(''.join(json.dumps(event.as_dict()) + '\n' for event in self.buffer))
+            self.buffer = list()
+        self.out.flush()
+    
+    def close(self):
+        self.flush()
+        if self.owns_out:
+            self.out.close()
+
+class AsyncSink():
+    '''Hands events to another sink on a background thread, so slow output never blocks the agent.
+    
+    Events are delivered in order but after the fact, so it suits log sinks rather than renderers that read the world.'''
+    def __init__(self, sink, maxsize=0):
+        self.sink = sink
+        self.queue = Queue(maxsize)
+        self.thread = Thread(target=self.drain, daemon=True)
+        self.thread.start()
+    
+    def drain(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            self.sink.emit(event)
+    
+    def emit(self, event):
+        self.queue.put(event)
     
-    def inlist(self, node):
-        for i in range(len(self)):
-            if self[i].pos == node.pos:
-                return [True, i]
-        return [False, i]
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.sink.close()
+
+class UndoLog():
+    '''Journal of the changes made to a World (and the Agent exploring it) since a snapshot.
+    
+    Every mutation records how to revert itself, so taking a snapshot only notes the length of the journal and restoring
+    one replays the entries recorded since, newest first. Nothing is copied, whatever the size of the world.'''
+    def __init__(self):
+        self.entries = list()
+        self.replaying = False # undoing a change must not journal it again
+    
+    def record(self, undo, *args):
+        if not self.replaying:
+            self.entries.append((undo, args))
+    
+    def mark(self):
+        return len(self.entries)
+    
+    def rollback(self, mark):
+        self.replaying = True
+        try:
+            while len(self.entries) > mark:
+                undo, args = self.entries.pop()
+                undo(*args)
+        finally:
+            self.replaying = False
+
+class Adjacency():
+    '''Neighbours of the cells of a dimensions x dimensions board, shared by every world and agent of that size through adjacency().
+    
+    Cells are flat indices x * dimensions + y. On large boards the cells around cell i are derived from its index rather
+    than stored, so they cost nothing per cell: interior cells, by far the most common, take one range check and the
+    edge cells filter the same offsets. Boards up to TABULATED cells a side, where memory doesn't matter and calls do,
+    look them up in tables instead. ray() gives the cells an arrow flies through. Either way the hot loops neither call
+    World.in_world nor build offset tuples.'''
+    ORTHOGONAL = ((-1, 0), (0, 1), (1, 0), (0, -1)) # (N, E, S, W), the order new nodes join the agent's frontier in
+    DIAGONAL = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+    TABULATED = 32 # at most 1024 cells, about 350 KB of tables
+    
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        if dimensions <= Adjacency.TABULATED: # the tables' lookups shadow the methods below
+            self.neighbours = [self.neighbours(i) for i in range(dimensions * dimensions)].__getitem__
+            self.diagonals = [self.diagonals(i) for i in range(dimensions * dimensions)].__getitem__
+    
+    def neighbours(self, i):
+        '''Returns the cells orthogonally next to cell i, in ORTHOGONAL order.'''
+        n = self.dimensions
+        x, y = divmod(i, n)
+        if 0 < x < n - 1 and 0 < y < n - 1:
+            return (i - n, i + 1, i + n, i - 1)
+        return tuple(i + dx * n + dy for dx, dy in Adjacency.ORTHOGONAL if 0 <= x + dx < n and 0 <= y + dy < n)
+    
+    def diagonals(self, i):
+        '''Returns the cells diagonally next to cell i, in DIAGONAL order.'''
+        n = self.dimensions
+        x, y = divmod(i, n)
+        if 0 < x < n - 1 and 0 < y < n - 1:
+            return (i + n + 1, i + n - 1, i - n + 1, i - n - 1)
+        return tuple(i + dx * n + dy for dx, dy in Adjacency.DIAGONAL if 0 <= x + dx < n and 0 <= y + dy < n)
+    
+    def ray(self, i, orientation):
+        '''Returns the cells from cell i (excluded) to the edge of the board in the given (dx, dy) direction.'''
+        n = self.dimensions
+        if orientation[0] == 0: # along the row
+            return range(i + orientation[1], i - i % n + (n if orientation[1] > 0 else -1), orientation[1])
+        return range(i + orientation[0] * n, n * n if orientation[0] > 0 else -1, orientation[0] * n)
+
+@lru_cache(maxsize=16)
+def adjacency(dimensions):
+    return Adjacency(dimensions)
 
 class World():
-    def __init__(self, dimensions=4, cwumpus=1, cpits=3, cgold=1, world_lst=None):
+    REDRAWS = 10000 # worlds drawn at most to find a solvable one
+    
+    def __init__(self, dimensions=4, cwumpus=1, cpits=3, cgold=1, world_lst=None, solvable=False, arrows=0, rng=None):
+        self.rng = rng or random # a random.Random to generate the world from, the global RNG by default
+        self.log = None # UndoLog journaling changes while a snapshot is held
         self.wumpus = list()
         self.pits = list()
         self.gold = list()
+        self.adjacency = adjacency(len(world_lst) if world_lst else dimensions)
         
         if world_lst: # for hard-coded world
             self.world = world_lst
+            for x in range(len(self.world)):
+                for y in range(len(self.world)):
+                    if self.world[x][y].type == 'W':
+                        self.wumpus.append((x, y))
+                    elif self.world[x][y].type in (' ', 'P'):
+                        self.pits.append((x, y))
+                    elif self.world[x][y].type == 'G':
+                        self.gold.append((x, y))
         else:
-            self.world = [[Node() for i in range(0, dimensions)] for j in range(0, dimensions)]
-            self.initial_safety = [(len(self.world) - 1, 0), (len(self.world) - 1, 1), (len(self.world) - 2, 0)] # to make sure agent has at least two viable paths at the beginning
-            self.place_wumpus(cwumpus)
-            self.place_pits(cpits)
-            self.place_gold(cgold)
+            for _ in range(World.REDRAWS):
+                self.world = self.new_grid(dimensions)
+                self.initial_safety = [(len(self.world) - 1, 0), (len(self.world) - 1, 1), (len(self.world) - 2, 0)] # to make sure agent has at least two viable paths at the beginning
+                self.place_wumpus(cwumpus)
+                self.place_pits(cpits)
+                self.place_gold(cgold)
+                if not solvable or self.is_solvable(arrows): # otherwise draw a new world
+                    break
+                self.wumpus, self.pits, self.gold = list(), list(), list()
+            else:
+                raise ValueError('no solvable world found in %d draws' % World.REDRAWS)
         
+    def new_grid(self, dimensions):
+        '''Creates an empty dimensions x dimensions grid of nodes.'''
+        return [[Node() for i in range(0, dimensions)] for j in range(0, dimensions)]
+    
+    def percept_bits(self, pos):
+        '''Returns the percepts of the node at the given position as STENCH/BREEZE/GLITTER bit flags.'''
+        bits = 0
+        for percept in self.world[pos[0]][pos[1]].env:
+            bits |= PERCEPT_BITS.get(percept, 0)
+        return bits
+    
+    def layout(self):
+        '''Returns a compact, hashable description of the world: its dimensions and the sorted flat indices of its wumpus, pits and gold.'''
+        n = len(self.world)
+        return (n, tuple(sorted(x * n + y for x, y in self.wumpus)), tuple(sorted(x * n + y for x, y in self.pits)),
+                tuple(sorted(x * n + y for x, y in self.gold)))
+    
+    def is_solvable(self, arrows=0):
+        '''Checks that every gold can be reached from the start without stepping on a hazard, possibly after shooting a wumpus.'''
+        return solvable_layout(*self.layout(), arrows=min(arrows, 1))
+    
     def in_world(self, point):
         return (point[0] >= 0 and point[1] >= 0 and point[0] < len(self.world) and point[1] < len(self.world))
     
+    def is_hazard(self, pos):
+        '''Tells whether a live wumpus or a pit sits at the given position.'''
+        return self.world[pos[0]][pos[1]].type in ('W', ' ', 'P')
+    
+    def free_cell(self, kind, taken, accept=None):
+        '''Draws random cells until one is neither taken nor among the initial safe cells, and passes `accept` if given.'''
+        n = len(self.world)
+        for _ in range(64 * n * n): # a free cell turns up long before this, unless there is none
+            x, y = self.rng.randint(0, n - 1), self.rng.randint(0, n - 1)
+            if not (x, y) in taken and not (x, y) in self.initial_safety and (accept is None or accept(x, y)):
+                return x, y
+        raise ValueError('no room left for ' + kind + ' in the world')
+    
     def place_wumpus(self, count):
-        while count != 0:
-            while True:
-                x, y = randint(0, len(self.world) - 1), randint(0, len(self.world) - 1)
-                if not (x, y) in self.wumpus and not (x, y) in self.initial_safety:
-                    self.world[x][y].type = 'W'
-                    self.wumpus.append((x, y))
-                    
-                    for i in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-                        if self.in_world((x + i[0], y + i[1])):
-                            if not 'S' in self.world[x + i[0]][y + i[1]].env and self.world[x + i[0]][y + i[1]].type != ' ':
-                                self.world[x + i[0]][y + i[1]].env.append('S')
-                    break
-            count -= 1
+        taken = set(self.wumpus) # constant time membership tests, the list keeps the placement order
+        for _ in range(count):
+            pos = self.free_cell('a wumpus', taken)
+            self.put_wumpus(*pos)
+            self.wumpus.append(pos)
+            taken.add(pos)
     
     def place_pits(self, count):
-        while count != 0:
-            while True:
-                x, y = randint(0, len(self.world) - 1), randint(0, len(self.world) - 1)
-                if not (x, y) in self.pits and not (x, y) in self.wumpus and not (x, y) in self.initial_safety:
-                    self.world[x][y].type = ' '
-                    self.world[x][y].env = list()
-                    self.pits.append((x, y))
-                    
-                    for i in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-                        if self.in_world((x + i[0], y + i[1])):
-                            if not 'B' in self.world[x + i[0]][y + i[1]].env and self.world[x + i[0]][y + i[1]].type != ' ':
-                                self.world[x + i[0]][y + i[1]].env.append('B')
-                    break
-            count -= 1
+        taken = set(self.pits).union(self.wumpus)
+        for _ in range(count):
+            pos = self.free_cell('a pit', taken)
+            self.put_pit(*pos)
+            self.pits.append(pos)
+            taken.add(pos)
     
     def place_gold(self, count):
-        while count != 0:
-            while True:
-                x, y = randint(0, len(self.world) - 1), randint(0, len(self.world) - 1)
-                if not (x, y) in self.gold and not (x, y) in self.pits and not (x, y) in self.wumpus and not (x, y) in self.initial_safety:
-                    safe_cnt = 4 # to make sure gold isn't surrounded by pits. This doesn't mean there will always be a path to gold, but decreases the chances of unsolvable cases.
-                    for i in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-                        tx, ty = x + i[0], y + i[1]
-                        if self.in_world((tx, ty)):
-                            if (tx, ty) in self.pits:
-                                safe_cnt -= 1
-                        else:
-                            safe_cnt -= 1
-                    if safe_cnt != 0:
-                        self.world[x][y].type = 'G'
-                        self.world[x][y].env.append('g')
-                        self.gold.append((x, y))
-                        break
-            count -= 1
+        n, pits = len(self.world), set(self.pits)
+        taken = pits.union(self.gold, self.wumpus)
+        # to make sure gold isn't surrounded by pits (or the world's edge). This doesn't mean there will always be a path to gold, but decreases the chances of unsolvable cases.
+        open_side = lambda x, y: any(not divmod(j, n) in pits for j in self.adjacency.neighbours(x * n + y))
+        for _ in range(count):
+            pos = self.free_cell('gold', taken, open_side)
+            self.put_gold(*pos)
+            self.gold.append(pos)
+            taken.add(pos)
+    
+    def put_wumpus(self, x, y):
+        '''Writes a wumpus and its stench into the grid.'''
+        n = len(self.world)
+        self.world[x][y].type = 'W'
+        for j in self.adjacency.neighbours(x * n + y):
+            node = self.world[j // n][j % n]
+            if not 'S' in node.env and node.type != ' ':
+                node.env.append('S')
+    
+    def put_pit(self, x, y):
+        '''Writes a pit, which carries no percepts, and its breeze into the grid.'''
+        n = len(self.world)
+        self.world[x][y].type = ' '
+        self.world[x][y].env = list()
+        for j in self.adjacency.neighbours(x * n + y):
+            node = self.world[j // n][j % n]
+            if not 'B' in node.env and node.type != ' ':
+                node.env.append('B')
+    
+    def put_gold(self, x, y):
+        '''Writes glittering gold into the grid.'''
+        self.world[x][y].type = 'G'
+        self.world[x][y].env.append('g')
+    
+    def place_layout(self, wumpus, pits, gold):
+        '''Places wumpus, pits and gold at the given positions of an empty world, with the same percepts as random placement.'''
+        for kind, put in ((wumpus, self.put_wumpus), (pits, self.put_pit), (gold, self.put_gold)):
+            for x, y in kind:
+                put(x, y)
+        self.wumpus = list(wumpus)
+        self.pits = list(pits)
+        self.gold = list(gold)
+    
+    def load_cells(self, cells, wumpus, pits, gold):
+        '''Fills an empty world from CompactGrid-encoded cell bytes and the positions of its wumpus, pits and gold.'''
+        for x in range(len(self.world)):
+            for y in range(len(self.world)):
+                cell = cells[x * len(self.world) + y]
+                self.world[x][y].type = CompactGrid.TYPES[cell >> 3 & 0x7]
+                self.world[x][y].env = [percept for percept in ('S', 'B', 'g') if cell & PERCEPT_BITS[percept]]
+        self.wumpus = list(wumpus)
+        self.pits = list(pits)
+        self.gold = list(gold)
+    
+    def set_type(self, pos, ntype):
+        if self.log is not None:
+            self.log.record(self.set_type, pos, self.world[pos[0]][pos[1]].type)
+        self.world[pos[0]][pos[1]].type = ntype
+    
+    def set_env(self, pos, env):
+        if self.log is not None:
+            self.log.record(self.set_env, pos, list(self.world[pos[0]][pos[1]].env))
+        self.world[pos[0]][pos[1]].env = env
+    
+    def remove_percept(self, pos, percept):
+        self.set_env(pos, [p for p in self.world[pos[0]][pos[1]].env if p != percept])
+    
+    def remove_wumpus(self, pos):
+        i = self.wumpus.index(pos)
+        if self.log is not None:
+            self.log.record(self.wumpus.insert, i, pos)
+        del self.wumpus[i]
+    
+    def snapshot(self):
+        '''Starts journaling changes to the world and returns a mark that restore() rewinds it to.'''
+        if self.log is None:
+            self.log = UndoLog()
+        return self.log.mark()
+    
+    def restore(self, mark):
+        self.log.rollback(mark)
+    
+    def release(self):
+        '''Stops journaling; snapshots taken so far can no longer be restored.'''
+        self.log = None
     
     def __getitem__(self, item):
         return self.world[item]
@@ -125,16 +519,1031 @@ class World():
         return len(self.world)
     
     def __str__(self):
-        string = ""
-        for i in self.world:
-            for j in i:
-                print(j.type, end='  ')
-            print()
-        return string
+        return '\n'.join('  '.join(j.type for j in i) + '  ' for i in self.world)
+
+def reachable_cells(dimensions, blocked, start):
+    '''Flood-fills the world from the flat index `start`, never entering the cells in `blocked`.'''
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        i = frontier.pop()
+        x, y = divmod(i, dimensions)
+        for j, inside in ((i - dimensions, x > 0), (i + dimensions, x < dimensions - 1), (i - 1, y > 0), (i + 1, y < dimensions - 1)):
+            if inside and not j in seen and not j in blocked:
+                seen.add(j)
+                frontier.append(j)
+    return seen
+
+def firing_cells(dimensions, target, wumpus):
+    '''Yields the cells an arrow can be shot from to hit the wumpus at `target` before any other wumpus.'''
+    x, y = divmod(target, dimensions)
+    for dx, dy in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
+        tx, ty = x + dx, y + dy
+        while 0 <= tx < dimensions and 0 <= ty < dimensions and not tx * dimensions + ty in wumpus:
+            yield tx * dimensions + ty
+            tx, ty = tx + dx, ty + dy
+
+SOLVABLE = dict() # solvable_layout's answers by a digest of the layout, oldest first
+SOLVABLE_SIZE = 1 << 16 # layouts remembered; every 4x4 board with the default counts fits, at about 6 MB
+
+def solvable_layout(dimensions, wumpus, pits, gold, arrows=0):
+    '''Checks that every gold can be reached from the start cell (dimensions - 1, 0) through cells without hazards.
+    
+    With an arrow, a world also counts as solvable if killing a single wumpus, shot from a reachable cell, opens up a
+    path to all the gold. Arguments are the layout given by World.layout. Answers are memoized per distinct board under
+    a 16-byte digest of the layout, so an entry costs the same on any board size.'''
+    key = hashlib.blake2b(array('I', (dimensions, arrows, len(wumpus), len(pits)) + wumpus + pits + gold).tobytes(), digest_size=16).digest()
+    solvable = SOLVABLE.get(key)
+    if solvable is None:
+        solvable = SOLVABLE[key] = reaches_gold(dimensions, wumpus, pits, gold, arrows)
+        if len(SOLVABLE) > SOLVABLE_SIZE:
+            del SOLVABLE[next(iter(SOLVABLE))]
+    return solvable
+
+def reaches_gold(dimensions, wumpus, pits, gold, arrows=0):
+    '''The check behind solvable_layout, without the memo.'''
+    start = (dimensions - 1) * dimensions
+    reach = reachable_cells(dimensions, set(pits).union(wumpus), start)
+    if all(g in reach for g in gold):
+        return True
+    if arrows == 0:
+        return False
+    
+    for target in wumpus:
+        if any(cell in reach for cell in firing_cells(dimensions, target, wumpus)):
+            reach_after = reachable_cells(dimensions, set(pits).union(w for w in wumpus if w != target), start)
+            if all(g in reach_after for g in gold):
+                return True
+    return False
+
+class CompactEnv():
+    '''List-like view of the percept bits of a compact cell.'''
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+    
+    def __contains__(self, percept):
+        return bool(self.grid.cells[self.index] & PERCEPT_BITS.get(percept, 0))
+    
+    def __iter__(self):
+        bits = self.grid.cells[self.index]
+        return iter([percept for percept in ('S', 'B', 'g') if bits & PERCEPT_BITS[percept]])
+    
+    def __len__(self):
+        return len(list(iter(self)))
+    
+    def append(self, percept):
+        self.grid.cells[self.index] |= PERCEPT_BITS[percept]
+    
+    def remove(self, percept):
+        if not percept in self:
+            raise ValueError(percept + ' not in env')
+        self.grid.cells[self.index] &= ~PERCEPT_BITS[percept] & 0xFF
+    
+    def __repr__(self):
+        return repr(list(self))
+
+class CompactCell():
+    '''Node-like view of a single cell of a CompactGrid.'''
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+    
+    @property
+    def type(self):
+        return CompactGrid.TYPES[self.grid.cells[self.index] >> 3 & 0x7]
+    
+    @type.setter
+    def type(self, ntype):
+        self.grid.cells[self.index] = (self.grid.cells[self.index] & 0xC7) | (CompactGrid.TYPES.index(ntype) << 3)
+    
+    @property
+    def env(self):
+        return CompactEnv(self.grid, self.index)
+    
+    @env.setter
+    def env(self, env):
+        bits = 0
+        for percept in env:
+            bits |= PERCEPT_BITS[percept]
+        self.grid.cells[self.index] = (self.grid.cells[self.index] & 0xF8) | bits
+    
+class CompactRow():
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+    
+    def __getitem__(self, y):
+        if y < 0 or y >= self.grid.dimensions:
+            raise IndexError('world index out of range')
+        return CompactCell(self.grid, self.x * self.grid.dimensions + y)
+    
+    def __len__(self):
+        return self.grid.dimensions
+
+class CompactGrid():
+    '''Contiguous storage for a dimensions x dimensions world, one byte per cell.
+    
+    Each cell byte holds the percepts in bits 0-2 (STENCH, BREEZE, GLITTER) and the cell type in bits 3-5 (an index into TYPES).
+    The agent's beliefs about a cell are kept apart from the world, in its KnowledgeBase.'''
+    TYPES = ('0', 'W', ' ', 'G', 'A')
+    
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.cells = bytearray(dimensions * dimensions)
+    
+    def __getitem__(self, x):
+        if x < 0 or x >= self.dimensions:
+            raise IndexError('world index out of range')
+        return CompactRow(self, x)
+    
+    def __len__(self):
+        return self.dimensions
+
+class CompactWorld(World):
+    '''World backed by a CompactGrid instead of lists of Node objects. `world[x][y]` still yields Node-like cells.'''
+    def __init__(self, dimensions=4, cwumpus=1, cpits=3, cgold=1, world_lst=None, solvable=False, arrows=0, rng=None):
+        World.__init__(self, dimensions, cwumpus, cpits, cgold, world_lst, solvable, arrows, rng)
+        if world_lst: # World scanned the hard-coded grid of Nodes; its contents are placed again in a CompactGrid
+            self.world = self.new_grid(len(world_lst))
+            self.place_layout(self.wumpus, self.pits, self.gold)
+    
+    def new_grid(self, dimensions):
+        return CompactGrid(dimensions)
+    
+    def percept_bits(self, pos):
+        return self.world.cells[pos[0] * self.world.dimensions + pos[1]] & 0x7
+    
+    def is_hazard(self, pos):
+        return self.world.cells[pos[0] * self.world.dimensions + pos[1]] & 0x38 in (CompactGrid.TYPES.index('W') << 3, CompactGrid.TYPES.index(' ') << 3)
+    
+    def put_wumpus(self, x, y):
+        n, cells = self.world.dimensions, self.world.cells
+        cells[x * n + y] = (cells[x * n + y] & 0xC7) | CompactGrid.TYPES.index('W') << 3
+        for j in self.adjacency.neighbours(x * n + y):
+            if cells[j] & 0x38 != CompactGrid.TYPES.index(' ') << 3:
+                cells[j] |= STENCH
+    
+    def put_pit(self, x, y):
+        n, cells = self.world.dimensions, self.world.cells
+        cells[x * n + y] = CompactGrid.TYPES.index(' ') << 3 # pits carry no percepts
+        for j in self.adjacency.neighbours(x * n + y):
+            if cells[j] & 0x38 != CompactGrid.TYPES.index(' ') << 3:
+                cells[j] |= BREEZE
+    
+    def put_gold(self, x, y):
+        n, cells = self.world.dimensions, self.world.cells
+        cells[x * n + y] = (cells[x * n + y] & 0xC7) | CompactGrid.TYPES.index('G') << 3 | GLITTER
+    
+    def set_type(self, pos, ntype):
+        i = pos[0] * self.world.dimensions + pos[1]
+        cells = self.world.cells
+        if self.log is not None:
+            self.log.record(self.set_type, pos, CompactGrid.TYPES[cells[i] >> 3 & 0x7])
+        cells[i] = (cells[i] & 0xC7) | (CompactGrid.TYPES.index(ntype) << 3)
+    
+    def load_cells(self, cells, wumpus, pits, gold):
+        self.world.cells[:] = bytes(cells)
+        self.wumpus = list(wumpus)
+        self.pits = list(pits)
+        self.gold = list(gold)
+
+class WorldBatch():
+    '''A batch of worlds generated by generate_worlds, stored as CompactGrid-encoded cell bytes.
+    
+    `cells` has shape (count, dimensions * dimensions); `wumpus`, `pits` and `gold` hold the flat cell indices of
+    each world's hazards and gold, one row per world.'''
+    def __init__(self, dimensions, cells, wumpus, pits, gold, seed=None):
+        self.dimensions = dimensions
+        self.cells = cells
+        self.wumpus = wumpus
+        self.pits = pits
+        self.gold = gold
+        self.seed = seed
+    
+    def positions(self, indices):
+        return [divmod(int(i), self.dimensions) for i in indices]
+    
+    def world(self, k, compact=False):
+        '''Builds a World (or CompactWorld) for the k-th world of the batch.'''
+        world = (CompactWorld if compact else World)(self.dimensions, 0, 0, 0)
+        world.load_cells(self.cells[k].tobytes(), self.positions(self.wumpus[k]), self.positions(self.pits[k]), self.positions(self.gold[k]))
+        return world
+    
+    def __len__(self):
+        return len(self.cells)
+
+def neighbour_any(grids):
+    '''For a stack of boolean grids, marks every cell with at least one orthogonal neighbour set.'''
+    out = np.zeros_like(grids)
+    out[:, 1:, :] |= grids[:, :-1, :]
+    out[:, :-1, :] |= grids[:, 1:, :]
+    out[:, :, 1:] |= grids[:, :, :-1]
+    out[:, :, :-1] |= grids[:, :, 1:]
+    return out
+
+def sample_cells(rng, valid, k):
+    '''Draws k distinct cells per row uniformly from the cells marked valid, in random order.
+    
+    Returns the flat cell indices and a mask of the rows that had fewer than k valid cells.'''
+    keys = rng.random(valid.shape)
+    keys[~valid] = 2.0 # never drawn while a valid cell is left
+    chosen = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    chosen_keys = np.take_along_axis(keys, chosen, axis=1)
+    chosen = np.take_along_axis(chosen, chosen_keys.argsort(axis=1), axis=1)
+    return chosen, (chosen_keys >= 2.0).any(axis=1)
+
+def generate_world_chunk(rng, count, dimensions, cwumpus, cpits, cgold, solvable=False, arrows=0):
+    cells = dimensions * dimensions
+    allowed = np.ones(cells, dtype=bool)
+    for x, y in [(dimensions - 1, 0), (dimensions - 1, 1), (dimensions - 2, 0)]: # same initial safety as World
+        if 0 <= x < dimensions and 0 <= y < dimensions:
+            allowed[x * dimensions + y] = False
+    rows = np.arange(count)[:, None]
+    
+    if cwumpus + cpits > allowed.sum():
+        raise ValueError('not enough free cells for ' + str(cwumpus) + ' wumpus and ' + str(cpits) + ' pits')
+    if cwumpus + cpits > 0:
+        hazards, _ = sample_cells(rng, np.broadcast_to(allowed, (count, cells)), cwumpus + cpits)
+    else:
+        hazards = np.zeros((count, 0), dtype=np.intp)
+    wumpus, pits = hazards[:, :cwumpus], hazards[:, cwumpus:]
+    
+    wumpus_grid = np.zeros((count, cells), dtype=bool)
+    wumpus_grid[rows, wumpus] = True
+    wumpus_grid = wumpus_grid.reshape(count, dimensions, dimensions)
+    pit_grid = np.zeros((count, cells), dtype=bool)
+    pit_grid[rows, pits] = True
+    pit_grid = pit_grid.reshape(count, dimensions, dimensions)
+    
+    # gold can't go on a hazard or the initial safety cells, nor be fully enclosed by pits and world boundaries
+    walls = np.pad(pit_grid, ((0, 0), (1, 1), (1, 1)), constant_values=True).astype(np.int8)
+    enclosed = (walls[:, :-2, 1:-1] + walls[:, 2:, 1:-1] + walls[:, 1:-1, :-2] + walls[:, 1:-1, 2:]) == 4
+    valid = (allowed & ~(wumpus_grid | pit_grid | enclosed).reshape(count, cells))
+    if cgold > 0:
+        gold, rejected = sample_cells(rng, valid, cgold)
+    else:
+        gold, rejected = np.zeros((count, 0), dtype=np.intp), np.zeros(count, dtype=bool)
+    
+    if solvable: # flood-fill every world of the chunk at once from the start cell, over cells without hazards
+        free = ~(wumpus_grid | pit_grid)
+        reach = np.zeros_like(free)
+        reach[:, dimensions - 1, 0] = True
+        while True:
+            grown = reach | (neighbour_any(reach) & free)
+            if (grown == reach).all():
+                break
+            reach = grown
+        unsolved = ~np.take_along_axis(reach.reshape(count, cells), gold, axis=1).all(axis=1) & ~rejected
+        for k in np.flatnonzero(unsolved) if arrows else ():
+            # only the few worlds walled off by a wumpus need the exact check with the arrow
+            unsolved[k] = not solvable_layout(dimensions, tuple(sorted(wumpus[k].tolist())), tuple(sorted(pits[k].tolist())),
+                                              tuple(sorted(gold[k].tolist())), arrows=1)
+        rejected |= unsolved
+    
+    encoded = (neighbour_any(wumpus_grid) * STENCH | neighbour_any(pit_grid) * BREEZE).astype(np.uint8).reshape(count, cells)
+    encoded[rows, wumpus] |= CompactGrid.TYPES.index('W') << 3
+    encoded[rows, pits] = CompactGrid.TYPES.index(' ') << 3 # pits carry no percepts
+    encoded[rows, gold] |= CompactGrid.TYPES.index('G') << 3 | GLITTER
+    return encoded, wumpus, pits, gold, rejected
+
+def generate_worlds(count, dimensions=4, cwumpus=1, cpits=3, cgold=1, seed=None, retries=100, solvable=False, arrows=0):
+    '''Generates `count` random worlds in one go with NumPy, honouring the same constraints as World.
+    
+    Hazards are sampled without replacement and stench/breeze maps are computed with array shifts, so there are no
+    rejection loops. Worlds where the gold can't be placed, or that are unsolvable when `solvable` is set, are redrawn
+    up to `retries` times before giving up.'''
+    if np is None:
+        raise ImportError('generate_worlds requires NumPy')
+    rng = np.random.default_rng(seed)
+    chunk = max(1, (1 << 22) // (dimensions * dimensions)) # bounds the size of the temporary arrays
+    parts = list()
+    
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        encoded, wumpus, pits, gold, rejected = generate_world_chunk(rng, size, dimensions, cwumpus, cpits, cgold, solvable, arrows)
+        tries = 0
+        while rejected.any():
+            tries += 1
+            if tries > retries:
+                raise ValueError('could not generate a world with ' + str(cgold) + ' reachable gold')
+            redo = np.flatnonzero(rejected)
+            redone = generate_world_chunk(rng, len(redo), dimensions, cwumpus, cpits, cgold, solvable, arrows)
+            for column, part in zip((encoded, wumpus, pits, gold), redone):
+                column[redo] = part
+            rejected[redo] = redone[4]
+        parts.append((encoded, wumpus, pits, gold))
+    
+    if not parts:
+        parts.append(generate_world_chunk(rng, 0, dimensions, cwumpus, cpits, cgold)[:4])
+    return WorldBatch(dimensions, *[np.concatenate(column) for column in zip(*parts)], seed=seed)
+
+class Lockstep():
+    '''K agents stepped together on the worlds of a WorldBatch, their state kept as NumPy arrays, one entry per agent.
+    
+    step() takes one action per agent and applies it to every live agent at once, with the semantics of Agent.turn,
+    Agent.go_forward, Agent.shoot_at (without the walk to the dead wumpus that follows a scream) and Agent.pickup.
+    Percepts are then read for all agents as in Agent.check_percepts, as STENCH/BREEZE/GLITTER bits plus BUMP and
+    SCREAM, which like the Agent's percepts stay set until the next move or shot. Worlds are updated in place: moving
+    marks the agent's cell, a killed wumpus takes the stench off its neighbours and grabbed gold stops glittering.'''
+    FORWARD, LEFT, RIGHT, SHOOT, GRAB = range(5)
+    BUMP, SCREAM = 8, 16
+    
+    def __init__(self, worlds, arrows=1):
+        if np is None:
+            raise ImportError('Lockstep requires NumPy')
+        n = self.dimensions = worlds.dimensions
+        k = len(worlds)
+        self.cells = worlds.cells.copy()
+        self.rows = np.arange(k)
+        self.x = np.full(k, n - 1, dtype=np.int32)
+        self.y = np.zeros(k, dtype=np.int32)
+        self.facing = np.ones(k, dtype=np.int8) # index into Agent.orientations (N, E, S, W), starting east like Agent
+        self.dx = np.array([-1, 0, 1, 0], dtype=np.int32)
+        self.dy = np.array([0, 1, 0, -1], dtype=np.int32)
+        self.arrows = np.full(k, arrows, dtype=np.int32)
+        self.gold = np.zeros(k, dtype=np.int32)
+        self.gold_total = np.full(k, worlds.gold.shape[1], dtype=np.int32)
+        self.steps = np.zeros(k, dtype=np.int64)
+        self.alive = np.ones(k, dtype=bool)
+        self.bump = np.zeros(k, dtype=bool)
+        self.scream = np.zeros(k, dtype=bool)
+        self.kills = np.zeros(k, dtype=np.int32)
+        self.visited = np.zeros((k, n * n), dtype=bool)
+        start = (n - 1) * n
+        self.visited[:, start] = True
+        self.set_type(self.rows, np.full(k, start), 'A')
+        self.percepts = self.check_percepts()
+    
+    def set_type(self, rows, cells, ntype):
+        self.cells[rows, cells] = (self.cells[rows, cells] & 0xC7) | (CompactGrid.TYPES.index(ntype) << 3)
+    
+    def types(self, rows, cells):
+        return self.cells[rows, cells] >> 3 & 0x7
+    
+    def check_percepts(self):
+        '''Returns every agent's percepts as bits.'''
+        bits = self.cells[self.rows, self.x * self.dimensions + self.y] & 0x7
+        return (bits | self.bump * Lockstep.BUMP | self.scream * Lockstep.SCREAM).astype(np.uint8)
+    
+    def step(self, actions):
+        '''Applies one action per agent (dead agents ignore theirs) and returns the percepts that follow.'''
+        n = self.dimensions
+        live = self.alive
+        
+        turn = live & (actions == Lockstep.LEFT)
+        self.facing[turn] = (self.facing[turn] - 1) % 4
+        turn = live & (actions == Lockstep.RIGHT)
+        self.facing[turn] = (self.facing[turn] + 1) % 4
+        
+        rows = np.flatnonzero(live & (actions == Lockstep.FORWARD))
+        if len(rows):
+            nx, ny = self.x[rows] + self.dx[self.facing[rows]], self.y[rows] + self.dy[self.facing[rows]]
+            inside = (nx >= 0) & (ny >= 0) & (nx < n) & (ny < n)
+            self.bump[rows] = ~inside
+            rows, nx, ny = rows[inside], nx[inside], ny[inside]
+            self.set_type(rows, self.x[rows] * n + self.y[rows], '0')
+            self.x[rows], self.y[rows] = nx, ny
+            self.steps[rows] += 1
+            cells = nx * n + ny
+            ntype = self.types(rows, cells)
+            dead = (ntype == CompactGrid.TYPES.index('W')) | (ntype == CompactGrid.TYPES.index(' '))
+            self.alive[rows[dead]] = False
+            rows, cells = rows[~dead], cells[~dead]
+            self.set_type(rows, cells, 'A')
+            self.visited[rows, cells] = True
+        
+        rows = np.flatnonzero(live & (actions == Lockstep.SHOOT) & (self.arrows > 0))
+        if len(rows):
+            self.arrows[rows] -= 1
+            self.scream[rows] = False
+            ax, ay = self.x[rows], self.y[rows]
+            dx, dy = self.dx[self.facing[rows]], self.dy[self.facing[rows]]
+            flying = np.ones(len(rows), dtype=bool)
+            for _ in range(n - 1): # the arrow flies until it leaves the world or hits the first wumpus
+                ax, ay = ax + dx, ay + dy
+                flying &= (ax >= 0) & (ay >= 0) & (ax < n) & (ay < n)
+                if not flying.any():
+                    break
+                hit = np.flatnonzero(flying)
+                hit = hit[self.types(rows[hit], ax[hit] * n + ay[hit]) == CompactGrid.TYPES.index('W')]
+                if len(hit):
+                    flying[hit] = False
+                    shooters, hx, hy = rows[hit], ax[hit], ay[hit]
+                    self.scream[shooters] = True
+                    self.kills[shooters] += 1
+                    self.set_type(shooters, hx * n + hy, '0')
+                    for ox, oy in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+                        near = (hx + ox >= 0) & (hy + oy >= 0) & (hx + ox < n) & (hy + oy < n)
+                        self.cells[shooters[near], (hx + ox)[near] * n + (hy + oy)[near]] &= ~STENCH & 0xFF
+        
+        rows = np.flatnonzero(live & (actions == Lockstep.GRAB))
+        if len(rows):
+            cells = self.x[rows] * n + self.y[rows]
+            glitter = (self.cells[rows, cells] & GLITTER) != 0
+            rows, cells = rows[glitter], cells[glitter]
+            self.gold[rows] += 1
+            self.set_type(rows, cells, '0')
+            self.cells[rows, cells] &= ~GLITTER & 0xFF
+        
+        self.percepts = self.check_percepts()
+        return self.percepts
+
+def run_lockstep(agents, steps, dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, seed=0):
+    '''Steps `agents` agents on seeded worlds for `steps` rounds with a random policy that grabs whatever glitters,
+    and returns the aggregate counts and agent-steps per second.'''
+    engine = Lockstep(generate_worlds(agents, dimensions, cwumpus, cpits, cgold, seed=seed), arrows)
+    rng = np.random.default_rng(seed)
+    policy = np.array([Lockstep.FORWARD] * 6 + [Lockstep.LEFT, Lockstep.RIGHT] * 2 + [Lockstep.SHOOT], dtype=np.int8)
+    actions_taken = 0
+    
+    start = perf_counter()
+    for _ in range(steps):
+        actions = policy[rng.integers(0, len(policy), agents)]
+        actions[(engine.percepts & GLITTER) != 0] = Lockstep.GRAB
+        actions_taken += int(engine.alive.sum())
+        engine.step(actions)
+        if not engine.alive.any():
+            break
+    elapsed = perf_counter() - start
+    
+    return {'agents' : agents, 'steps' : steps, 'agent_steps' : actions_taken, 'seconds' : elapsed,
+            'steps_per_sec' : actions_taken / elapsed if elapsed > 0 else float('inf'), 'died' : int((~engine.alive).sum()),
+            'kills' : int(engine.kills.sum()), 'gold' : int(engine.gold.sum()), 'all_gold' : int((engine.gold == engine.gold_total).sum())}
+
+CORPUS_MAGIC = b'WUMPUSC1'
+CORPUS_HEADER = struct.Struct('<8sHHHHHQBBBxH') # magic, index width, dimensions, wumpus, pits, gold, world count, drawn by World,
+                                                 # solvable, arrows, shard size of a bulk corpus; 32 bytes
+
+def corpus_record(width, cwumpus, cpits, cgold):
+    '''Fixed-size record of a corpus: the episode seed followed by the flat indices of the wumpus, pits and gold.'''
+    return struct.Struct('<Q' + ('H' if width == 2 else 'I') * (cwumpus + cpits + cgold))
+
+def write_corpus(path, count, dimensions=4, cwumpus=1, cpits=3, cgold=1, seed=0, solvable=False, arrows=0, bulk=False, shard_size=1000):
+    '''Writes `count` seeded worlds to a corpus file that Corpus can memory-map.
+    
+    World k is generated from seed `seed + k` by World (or, with bulk=True, taken from generate_worlds called per shard of
+    `shard_size` seeds and seeded with the shard's first seed, as a --bulk batch does) and stored as a fixed-size record, so any world can be read back without parsing the ones before it. The
+    header records how the worlds were drawn, so that Corpus.rng can hand the agent the RNG state a seeded batch would.'''
+    width = 2 if dimensions * dimensions <= 0xFFFF else 4
+    record = corpus_record(width, cwumpus, cpits, cgold)
+    if bulk and not 0 < shard_size <= 0xFFFF:
+        raise ValueError('a bulk corpus takes a shard size between 1 and 65535')
+    
+    with open(path, 'wb') as f:
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, width, dimensions, cwumpus, cpits, cgold, count, not bulk, solvable, arrows,
+                                   shard_size if bulk else 0))
+        if bulk:
+            for start in range(0, count, shard_size):
+                size = min(shard_size, count - start)
+                batch = generate_worlds(size, dimensions, cwumpus, cpits, cgold, seed=seed + start, solvable=solvable, arrows=arrows)
+                records = np.zeros(size, dtype=[('seed', '<u8'), ('cells', '<u' + str(width), (cwumpus + cpits + cgold,))])
+                records['seed'] = np.arange(seed + start, seed + start + size)
+                records['cells'] = np.concatenate((batch.wumpus, batch.pits, batch.gold), axis=1)
+                f.write(records.tobytes())
+        else:
+            for k in range(count):
+                world = World(dimensions, cwumpus, cpits, cgold, solvable=solvable, arrows=arrows, rng=random.Random(seed + k))
+                _, wumpus, pits, gold = world.layout()
+                # layout() sorts the indices, which keeps the file independent of placement order
+                f.write(record.pack(seed + k, *(wumpus + pits + gold)))
+
+class Corpus():
+    '''Read-only, memory-mapped corpus file written by write_corpus.
+    
+    Every world is a fixed-size record at a known offset, so corpus.world(k) jumps straight to world k.'''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, width, self.dimensions, self.cwumpus, self.cpits, self.cgold, self.count,
+         self.drawn, self.solvable, self.arrows, self.shard_size) = CORPUS_HEADER.unpack_from(self.map, 0)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(path + ' is not a Wumpus World corpus')
+        self.record = corpus_record(width, self.cwumpus, self.cpits, self.cgold)
+        if len(self.map) < CORPUS_HEADER.size + self.count * self.record.size:
+            raise ValueError(path + ' is truncated')
+    
+    def __len__(self):
+        return self.count
+    
+    def entry(self, k):
+        '''Returns the seed of world k and the (x, y) positions of its wumpus, pits and gold.'''
+        if k < 0 or k >= self.count:
+            raise IndexError('corpus index out of range')
+        fields = self.record.unpack_from(self.map, CORPUS_HEADER.size + k * self.record.size)
+        cells = [divmod(i, self.dimensions) for i in fields[1:]]
+        return fields[0], cells[:self.cwumpus], cells[self.cwumpus:self.cwumpus + self.cpits], cells[self.cwumpus + self.cpits:]
+    
+    def seed(self, k):
+        return self.entry(k)[0]
+    
+    def rng(self, k):
+        '''Returns the RNG the agent on world k breaks ties with, in the state a seeded batch leaves it in.
+        
+        A seeded batch generates its World from the episode's RNG and lets the agent carry on drawing from it, so for
+        worlds drawn by World the placement draws are replayed on a scratch CompactWorld. Worlds of a bulk corpus (and of
+        corpora written before the header said how they were drawn) start from a fresh RNG, as in a --bulk batch.'''
+        rng = random.Random(self.seed(k))
+        if self.drawn:
+            CompactWorld(self.dimensions, self.cwumpus, self.cpits, self.cgold, solvable=self.solvable, arrows=self.arrows, rng=rng)
+        return rng
+    
+    def world(self, k, compact=False):
+        '''Builds a World (or CompactWorld) for world k of the corpus.'''
+        _, wumpus, pits, gold = self.entry(k)
+        world = (CompactWorld if compact else World)(self.dimensions, 0, 0, 0)
+        world.place_layout(wumpus, pits, gold)
+        return world
+    
+    def close(self):
+        self.map.close()
+
+CORPORA = dict() # corpora opened by this process, by path
+
+def open_corpus(path):
+    if not path in CORPORA:
+        CORPORA[path] = Corpus(path)
+    return CORPORA[path]
+
+STORE_MAGIC = b'WUMPUSR2'
+STORE_HEADER = struct.Struct('<8sHI2x') # magic, number of phase columns, length of the JSON run parameters that follow; 16 bytes
+STORE_RUN = dict(dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, solvable=False, corpus=None, bulk=False, lookahead=None,
+                 horizon=0, max_steps=None, max_seconds=None) # parameters of run_batch that decide the outcomes, with their defaults
+STORE_CHUNK = struct.Struct('<QII') # first seed, episode count, CRC32 of the columns; 16 bytes
+STORE_OUTCOMES = ('solved', 'died', 'stuck')
+STORE_COLUMNS = (('seed', 'Q'), ('size', 'H'), ('outcome', 'B'), ('steps', 'I'), ('shots', 'H')) + tuple((phase, 'f') for phase in Profiler.PHASES) # phase times in seconds
+
+class RunningStats():
+    '''Solve rate, step percentiles and phase time totals of the episodes seen so far, updated a chunk at a time.'''
+    def __init__(self):
+        self.episodes = 0
+        self.outcomes = [0] * len(STORE_OUTCOMES)
+        self.steps = dict() # steps -> number of episodes
+        self.phases = dict.fromkeys(Profiler.PHASES, 0.0)
+    
+    def add(self, columns):
+        self.episodes += len(columns['seed'])
+        for outcome in columns['outcome']:
+            self.outcomes[outcome] += 1
+        for steps in columns['steps']:
+            self.steps[steps] = self.steps.get(steps, 0) + 1
+        for phase in Profiler.PHASES:
+            self.phases[phase] += sum(columns[phase])
+    
+    def solve_rate(self):
+        return self.outcomes[0] / self.episodes if self.episodes else 0.0
+    
+    def percentile(self, q):
+        '''Returns the smallest step count at least q percent of the episodes didn't exceed.'''
+        seen = 0
+        for steps in sorted(self.steps):
+            seen += self.steps[steps]
+            if seen * 100 >= q * self.episodes:
+                return steps
+        return 0
+    
+    def as_dict(self):
+        return {'episodes' : self.episodes, 'solve_rate' : self.solve_rate(), **dict(zip(STORE_OUTCOMES, self.outcomes)),
+                'steps_p50' : self.percentile(50), 'steps_p90' : self.percentile(90), 'steps_p99' : self.percentile(99),
+                'phase_seconds' : self.phases}
+
+class ResultStore():
+    '''Append-only columnar file of per-episode results, written a chunk (one shard of a batch) at a time.
+    
+    Each chunk holds the columns of STORE_COLUMNS for a contiguous range of seeds and is fsynced before the next one
+    is written, so a crash loses at most the chunk being written: reopening the file drops a torn or corrupt tail and
+    `done` tells which seeds are committed, letting an interrupted run skip them. Running aggregates over every
+    committed episode are kept in `stats`.
+    
+    The header records the run's parameters (the STORE_RUN keys), and a store is only reopened for the same run, so
+    seeds committed under other parameters are never mistaken for done.'''
+    def __init__(self, path, run=None):
+        self.path = path
+        self.run = json.loads(json.dumps(dict(STORE_RUN, **(run or dict())))) # as read back from the header
+        self.done = list() # (first seed, stop) of every committed chunk
+        self.stats = RunningStats()
+        self.file = open(path, 'a+b')
+        self.file.seek(0)
+        header = self.file.read(STORE_HEADER.size)
+        if not header:
+            params = json.dumps(self.run, sort_keys=True).encode()
+            self.file.write(STORE_HEADER.pack(STORE_MAGIC, len(Profiler.PHASES), len(params)) + params)
+            self.commit()
+            self.start = self.file.tell()
+            return
+        magic, phases, length = STORE_HEADER.unpack(header)
+        if magic != STORE_MAGIC or phases != len(Profiler.PHASES):
+            self.file.close()
+            raise ValueError(path + ' is not a results store of this version')
+        stored = json.loads(self.file.read(length))
+        if stored != self.run:
+            self.file.close()
+            raise ValueError(path + ' holds the results of another run (' + ', '.join('%s=%s' % (key, stored.get(key))
+                             for key in sorted(self.run) if stored.get(key) != self.run[key]) + '), use another file')
+        self.start = end = STORE_HEADER.size + length
+        for columns in self.chunks():
+            self.done.append((columns['seed'][0], columns['seed'][-1] + 1))
+            self.stats.add(columns)
+            end = self.file.tell()
+        self.file.truncate(end) # whatever follows the last intact chunk was never committed
+    
+    def chunk_size(self, count):
+        return sum(array(code).itemsize for _, code in STORE_COLUMNS) * count
+    
+    def chunks(self):
+        '''Reads the committed chunks from the start of the file, stopping at the first torn or corrupt one.'''
+        self.file.seek(self.start)
+        while True:
+            head = self.file.read(STORE_CHUNK.size)
+            if len(head) < STORE_CHUNK.size:
+                return
+            first, count, crc = STORE_CHUNK.unpack(head)
+            body = self.file.read(self.chunk_size(count))
+            if len(body) < self.chunk_size(count) or zlib.crc32(body) != crc:
+                self.file.seek(-len(head) - len(body), 1)
+                return
+            columns, offset = dict(), 0
+            for name, code in STORE_COLUMNS:
+                columns[name] = array(code, body[offset:offset + array(code).itemsize * count])
+                offset += array(code).itemsize * count
+            yield columns
+    
+    def append(self, columns):
+        '''Writes one chunk of episodes, given as lists per column, and commits it.'''
+        count = len(columns['seed'])
+        if count == 0:
+            return
+        body = b''.join(array(code, columns[name]).tobytes() for name, code in STORE_COLUMNS)
+        self.file.seek(0, 2)
+        self.file.write(STORE_CHUNK.pack(columns['seed'][0], count, zlib.crc32(body)) + body)
+        self.commit()
+        self.done.append((columns['seed'][0], columns['seed'][-1] + 1))
+        self.stats.add(columns)
+    
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def pending(self, start, stop):
+        '''Splits the seeds [start, stop) into the ranges not committed yet.'''
+        ranges = [(start, stop)]
+        for first, end in self.done:
+            ranges = [part for lo, hi in ranges for part in ((lo, min(hi, first)), (max(lo, end), hi)) if part[0] < part[1]]
+        return ranges
+    
+    def column(self, name):
+        '''Returns a whole column over every committed chunk, in file order.'''
+        out = array(dict(STORE_COLUMNS)[name])
+        for columns in self.chunks():
+            out.extend(columns[name])
+        return out
+    
+    def close(self):
+        self.file.close()
+
+class Frontier():
+    '''The agent's tentative nodes, filed by risk score so the safest ones are found without scanning.
+    
+    Behaves like the list it replaces: iteration, `in`, len(), append() and remove(), in the order nodes joined the
+    frontier. Scores are kept in sync by the KnowledgeBase that owns it. Nodes with wumpus hints are tracked apart so
+    shooting decisions don't have to scan the frontier either.'''
+    def __init__(self, knowledge):
+        self.knowledge = knowledge
+        self.order = dict() # pos -> join number
+        self.filed = dict() # pos -> score it is filed under
+        self.buckets = dict() # score -> set of positions
+        self.heap = list() # distinct scores, may hold scores whose bucket has since emptied
+        self.wumpus = set()
+        self.joined = 0
+    
+    def __contains__(self, pos):
+        return pos in self.order
+    
+    def __iter__(self):
+        return iter(sorted(self.order, key=self.order.__getitem__))
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def file(self, pos, score):
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = set()
+            heappush(self.heap, score)
+        bucket.add(pos)
+        self.filed[pos] = score
+    
+    def unfile(self, pos):
+        score = self.filed.pop(pos)
+        bucket = self.buckets[score]
+        bucket.discard(pos)
+        if not bucket:
+            del self.buckets[score]
+    
+    def append(self, pos):
+        if self.knowledge.log is not None:
+            self.knowledge.log.record(self.unappend, pos)
+        self.joined += 1
+        self.order[pos] = self.joined
+        self.knowledge.set_tentative(self.knowledge.index(pos), 1)
+        self.file(pos, self.knowledge.score(pos))
+        if self.knowledge.maybe_wumpus(pos):
+            self.wumpus.add(pos)
+    
+    def remove(self, pos):
+        if self.knowledge.log is not None:
+            self.knowledge.log.record(self.reinsert, pos, self.order[pos])
+        del self.order[pos]
+        self.knowledge.set_tentative(self.knowledge.index(pos), 0)
+        self.unfile(pos)
+        self.wumpus.discard(pos)
+    
+    def unappend(self, pos):
+        self.remove(pos)
+        self.joined -= 1
+    
+    def reinsert(self, pos, order):
+        '''Puts a removed node back with its original join number.'''
+        self.order[pos] = order
+        self.knowledge.set_tentative(self.knowledge.index(pos), 1)
+        self.file(pos, self.knowledge.score(pos))
+        if self.knowledge.maybe_wumpus(pos):
+            self.wumpus.add(pos)
+    
+    def rescore(self, pos, score):
+        if self.filed[pos] != score:
+            self.unfile(pos)
+            self.file(pos, score)
+    
+    def min_score(self):
+        while not self.heap[0] in self.buckets: # drop scores nobody is filed under anymore
+            heappop(self.heap)
+        return self.heap[0]
+    
+    def best(self):
+        '''Returns the nodes with the lowest score, in the order they joined the frontier.'''
+        return sorted(self.buckets[self.min_score()], key=self.order.__getitem__)
+    
+    def riskiest_wumpus(self):
+        '''Returns the node with wumpus hints that has the highest score, the earliest one on ties.'''
+        if not self.wumpus:
+            return None
+        return min(self.wumpus, key=lambda pos: (-self.filed[pos], self.order[pos]))
+
+@lru_cache(maxsize=None)
+def zobrist_keys(dimensions):
+    '''Returns a random 64-bit key per cell of a world of the given size, the same for every world of that size.'''
+    size = dimensions * dimensions
+    return array('Q', random.Random(dimensions).getrandbits(64 * size).to_bytes(8 * size, 'little'))
+
+class KnowledgeBase():
+    '''The agent's beliefs about every cell of the world, kept in flat parallel arrays indexed by x * dimensions + y.
+    
+    A cell is either OPEN (it may still hide a pit or the wumpus), OK (known to be safe) or VISITED. For OPEN cells the
+    evidence gathered so far is kept as two counters, the number of breezes ('P?') and stenches ('W?') pointing at it,
+    alongside the risk score the agent uses to pick its next move. Percepts only ever touch the cells around the agent,
+    so updating the beliefs costs the same no matter how much evidence has piled up. All writes go through the setters
+    below so the frontier of tentative nodes stays in sync, and so they can be journaled while the agent holds a snapshot.
+    
+    They also keep `hash`, a Zobrist-style hash of every cell's beliefs and frontier membership: each write XORs out the
+    old value's share and XORs in the new one, so it costs the same on any world size. Cells never written contribute
+    nothing, which makes a fresh knowledge base hash to 0.'''
+    OPEN, OK, VISITED = 0, 1, 2
+    
+    def __init__(self, dimensions):
+        size = dimensions * dimensions
+        self.dimensions = dimensions
+        self.state = bytearray(size)
+        self.pits = array('I', bytes(4 * size))
+        self.wumpus = array('I', bytes(4 * size))
+        self.scores = array('f', [float('-inf')]) * size
+        self.tentative = bytearray(size) # flags the cells currently in the frontier
+        self.frontier = Frontier(self)
+        self.log = None # the UndoLog shared with the world while the agent holds a snapshot
+        self.keys = zobrist_keys(dimensions)
+        self.hash = 0
+    
+    def index(self, pos):
+        return pos[0] * self.dimensions + pos[1]
+    
+    def is_open(self, pos):
+        return self.state[pos[0] * self.dimensions + pos[1]] == KnowledgeBase.OPEN
+    
+    def maybe_wumpus(self, pos):
+        i = pos[0] * self.dimensions + pos[1]
+        return self.state[i] == KnowledgeBase.OPEN and self.wumpus[i] != 0
+    
+    def score(self, pos):
+        return self.scores[pos[0] * self.dimensions + pos[1]]
+    
+    def evidence(self, pos):
+        '''Returns the number of pit and wumpus hints pointing at the given cell.'''
+        i = pos[0] * self.dimensions + pos[1]
+        return self.pits[i], self.wumpus[i]
+    
+    def set_score(self, i, score):
+        if self.log is not None:
+            self.log.record(self.set_score, i, self.scores[i])
+        key = self.keys[i]
+        old = self.scores[i]
+        self.scores[i] = score
+        self.hash ^= hash((key, 0, old)) ^ hash((key, 0, self.scores[i])) # each field's share of the hash mixes the cell's key, the field and its value
+        if self.tentative[i]:
+            self.frontier.rescore(divmod(i, self.dimensions), self.scores[i]) # read back so the frontier files the stored float32 value
+    
+    def set_evidence(self, i, pits, wumpus):
+        if self.log is not None:
+            self.log.record(self.set_evidence, i, self.pits[i], self.wumpus[i])
+        key = self.keys[i]
+        self.hash ^= hash((key, 1, self.pits[i], self.wumpus[i])) ^ hash((key, 1, pits, wumpus))
+        self.pits[i] = pits
+        self.wumpus[i] = wumpus
+        self.sync_wumpus(i)
+    
+    def set_state(self, i, state):
+        if self.log is not None:
+            self.log.record(self.set_state, i, self.state[i])
+        key = self.keys[i]
+        self.hash ^= hash((key, 2, self.state[i])) ^ hash((key, 2, state))
+        self.state[i] = state
+        self.sync_wumpus(i)
+    
+    def set_tentative(self, i, flag):
+        if self.tentative[i] != flag:
+            self.hash ^= self.keys[i] # a cell's frontier membership is worth its bare key
+        self.tentative[i] = flag
+    
+    def sync_wumpus(self, i):
+        if self.tentative[i]:
+            pos = divmod(i, self.dimensions)
+            if self.state[i] == KnowledgeBase.OPEN and self.wumpus[i] != 0:
+                self.frontier.wumpus.add(pos)
+            else:
+                self.frontier.wumpus.discard(pos)
+    
+    def visit(self, pos):
+        i = pos[0] * self.dimensions + pos[1]
+        self.set_state(i, KnowledgeBase.VISITED)
+        self.set_score(i, float('inf'))
+
+class DistanceMap():
+    '''Breadth-first distances from a source cell to every cell of the agent's visited region.
+    
+    The region only ever grows, one cell at a time, and a new cell can only shorten distances, so each one is folded in
+    by relaxing the cells around it instead of searching again. Changes are journaled to the cache's UndoLog, if any.'''
+    def __init__(self, cache, source):
+        self.cache = cache
+        self.source = source
+        self.dist = {source : 0}
+        adj = cache.adjacency
+        n = adj.dimensions
+        queue = deque([source])
+        while queue:
+            pos = queue.popleft()
+            for j in adj.neighbours(pos[0] * n + pos[1]):
+                npos = divmod(j, n)
+                if npos in cache.region and not npos in self.dist:
+                    self.dist[npos] = self.dist[pos] + 1
+                    queue.append(npos)
+    
+    def __len__(self):
+        return len(self.dist)
+    
+    def set(self, pos, d):
+        if self.cache.log is not None:
+            self.cache.log.record(self.unset, pos, self.dist.get(pos))
+        self.dist[pos] = d
+    
+    def unset(self, pos, d):
+        if d is None:
+            del self.dist[pos]
+        else:
+            self.dist[pos] = d
+    
+    def add(self, cell):
+        '''Folds in a cell that just joined the region.'''
+        adj = self.cache.adjacency
+        n = adj.dimensions
+        d = min((self.dist[divmod(j, n)] for j in adj.neighbours(cell[0] * n + cell[1]) if divmod(j, n) in self.dist), default=None)
+        if d is None: # not connected to the source (yet)
+            return
+        self.set(cell, d + 1)
+        queue = deque([cell])
+        while queue:
+            pos = queue.popleft()
+            d = self.dist[pos] + 1
+            for j in adj.neighbours(pos[0] * n + pos[1]):
+                npos = divmod(j, n)
+                if npos in self.cache.region and self.dist.get(npos, d + 1) > d:
+                    self.set(npos, d)
+                    queue.append(npos)
+    
+    def walk(self, start):
+        '''Returns the cells of a shortest path from `start` (excluded) down to the source (included), or None if `start` isn't mapped.'''
+        d = self.dist.get(start)
+        if d is None:
+            return None
+        adj = self.cache.adjacency
+        n = adj.dimensions
+        path = list()
+        pos = start
+        while d:
+            d -= 1
+            for j in adj.neighbours(pos[0] * n + pos[1]):
+                if self.dist.get(divmod(j, n)) == d:
+                    pos = divmod(j, n)
+                    break
+            path.append(pos)
+        return path
+
+class PathCache():
+    '''Distance maps over the agent's visited region, rooted at the cells it keeps walking back to.
+    
+    The escape point's map lives for the whole episode. Other maps are built on demand and dropped least recently used
+    first once there are more than `maps` of them or they hold more than `limit` distances between them, so the cache
+    stays bounded on huge worlds.'''
+    def __init__(self, region, pinned, adjacency, maps=8, limit=1 << 16):
+        self.region = region # the agent's visited set, shared
+        self.adjacency = adjacency
+        self.log = None # the agent's UndoLog while it holds a snapshot
+        self.maps = dict() # source -> DistanceMap, least recently used first
+        self.pinned = DistanceMap(self, pinned)
+        self.capacity = maps
+        self.limit = limit
+    
+    def get(self, source):
+        '''Returns the map rooted at `source`, if one is cached.'''
+        if source == self.pinned.source:
+            return self.pinned
+        dmap = self.maps.pop(source, None)
+        if dmap is not None:
+            self.maps[source] = dmap # most recently used now
+        return dmap
+    
+    def build(self, source):
+        dmap = self.maps[source] = DistanceMap(self, source)
+        if self.log is not None:
+            self.log.record(self.drop, source)
+        while len(self.maps) > 1 and (len(self.maps) > self.capacity or sum(map(len, self.maps.values())) > self.limit):
+            self.drop(next(iter(self.maps)))
+        return dmap
+    
+    def drop(self, source):
+        dmap = self.maps.pop(source)
+        if self.log is not None:
+            self.log.record(self.keep, source, dmap)
+    
+    def keep(self, source, dmap):
+        self.maps[source] = dmap
+    
+    def add(self, cell):
+        '''Folds a newly visited cell into every cached map.'''
+        self.pinned.add(cell)
+        for dmap in self.maps.values():
+            dmap.add(cell)
+
+class SearchArena():
+    '''Scratch arrays for the agent's A* searches, indexed by flat cell index and reused from one search to the next.
+    
+    A cell's g-score and parent only count if its `seen` stamp matches the current search (and it is closed if its
+    `closed` stamp does), so starting a search costs one increment instead of clearing the arrays. Heap entries are packed
+    into single ints ordered like (f, deepest first, insertion order, cell), so expanding a node allocates no tuples,
+    dicts or sets.'''
+    def __init__(self, cells):
+        self.cells = cells
+        self.bits = (4 * cells + 1).bit_length() # wide enough for a g-score, an insertion number (at most 4 per cell) or a cell
+        self.search = 0
+        self.reset()
+    
+    def reset(self):
+        self.g = array('I', bytes(4 * self.cells))
+        self.parent = array('i', bytes(4 * self.cells))
+        self.seen = array('I', bytes(4 * self.cells))
+        self.closed = array('I', bytes(4 * self.cells))
+    
+    def begin(self):
+        '''Starts a new search and returns its stamp.'''
+        self.search += 1
+        if self.search > 0xFFFFFFFF: # the stamps would wrap around
+            self.search = 1
+            self.reset()
+        return self.search
 
 class Agent:
-    def __init__(self, world: World, arrows=1):
+    def __init__(self, world: World, arrows=1, verbose=True, rng=None, sink=None, planner=None, max_steps=None, max_seconds=None):
         self.world = world
+        self.rng = rng or random # breaks ties between equally good moves
+        self.planner = planner # a Lookahead to break those ties by simulation instead
+        self.profiler = None
+        if sink is None and verbose: # the classic demo: narrate every action and redraw the world once a second
+            sink = ThrottledRenderer(world, delay=1)
+        self.sink = sink # receives an Event for every action; None runs the agent headless
+        self.steps = 0
+        self.max_steps = max_steps # moves after which the episode is given up as stuck
+        self.max_seconds = max_seconds # the same for wall time, counted from run()
+        self.deadline = None
+        self.seen = dict() # hashes of the states decisions were taken in, in order, to catch the agent going round in circles
         self.pos = (len(world) - 1, 0)
         self.percepts = {'Stench' : False, 'Breeze' : False, 'Glitter' : False, 'Bump' : False, 'Scream' : False}
         self.objectives = {'Get Gold' : False}
@@ -143,44 +1552,80 @@ class Agent:
         self.gold = 0
         self.arrows = arrows
         self.escape_point = self.pos
-        self.tentative_nodes = list()
+        self.adjacency = adjacency(len(world)) # the same as the world's, and unaffected by Lookahead swapping in sampled worlds
+        self.knowledge = KnowledgeBase(len(world))
+        self.tentative_nodes = self.knowledge.frontier
         self.visited = [self.pos]
+        self.visited_set = {self.pos} # mirrors self.visited for constant time membership tests
+        self.paths = PathCache(self.visited_set, self.pos, self.adjacency) # shortest paths back to the escape point and other revisited nodes
+        self.arena = None # SearchArena of the A* fallback, allocated on its first search
+        self.first_visited = {('row', self.pos[0]) : (0, self.pos), ('col', self.pos[1]) : (0, self.pos)} # earliest visited node on each row/column
         
         # placing agent into the initial position
-        self.world[self.pos[0]][self.pos[1]].type = 'A'
-        self.world[self.pos[0]][self.pos[1]].markers = 'V'
-        self.world[self.pos[0]][self.pos[1]].score = float('inf')
+        self.world.set_type(self.pos, 'A')
+        self.knowledge.visit(self.pos)
+    
+    def instrument(self, profiler):
+        '''Times every phase of the decision loop with the given Profiler and feeds it the search counters.'''
+        self.profiler = profiler
+        for phase in Profiler.PHASES:
+            setattr(self, phase, profiler.wrap(phase, getattr(self, phase)))
+    
+    def snapshot(self):
+        '''Returns a snapshot that restore() rewinds the agent and its world to.
+        
+        Changes are journaled from here on rather than copied up front, so a snapshot costs the same on any world size.
+        Snapshots nest; restoring one discards those taken after it.'''
+        self.knowledge.log = self.paths.log = self.world.log = self.world.log or UndoLog()
+        return (self.world.snapshot(), self.pos, self.orientation, self.steps, self.gold, self.arrows, dict(self.percepts),
+                dict(self.objectives), len(self.visited), len(self.seen))
+    
+    def restore(self, snapshot):
+        mark, self.pos, self.orientation, self.steps, self.gold, self.arrows, percepts, objectives, visited, seen = snapshot
+        self.percepts.update(percepts)
+        self.objectives.update(objectives)
+        self.world.restore(mark)
+        while len(self.seen) > seen: # states are only ever added, newest last
+            self.seen.popitem()
+        while len(self.visited) > visited: # the visited nodes only ever grow, so they are trimmed instead of journaled
+            pos = self.visited.pop()
+            self.visited_set.discard(pos)
+            for key in (('row', pos[0]), ('col', pos[1])):
+                if self.first_visited.get(key) == (len(self.visited), pos):
+                    del self.first_visited[key]
+    
+    def release(self):
+        '''Stops journaling changes once no snapshot needs restoring anymore.'''
+        self.knowledge.log = self.paths.log = None
+        self.world.release()
+    
+    def emit(self, kind, pos=None, detail=None):
+        '''Sends an Event to the agent's sink, if it has one.'''
+        if self.sink is not None:
+            self.sink.emit(Event(kind, self.steps, pos, detail))
     
     def turn(self, direction):
         '''Turns the agent left or right, changing its orientation.'''
         alpha_orientation = ('N', 'E', 'S', 'W')
         if direction == 'R':
             self.orientation = self.orientations[(self.orientations.index(self.orientation) + 1) % 4]
-            print('Turning right. Orientation:', alpha_orientation[self.orientations.index(self.orientation)])
         else:
             self.orientation = self.orientations[(self.orientations.index(self.orientation) - 1) % 4]
-            print('Turning left. Orientation:', alpha_orientation[self.orientations.index(self.orientation)])
+        self.emit('turn', self.pos, (direction, alpha_orientation[self.orientations.index(self.orientation)]))
     
     def check_percepts(self):
         '''Checking the environment for anything the agent can perceive.'''
-        if 'g' in self.world[self.pos[0]][self.pos[1]].env:
-            self.percepts['Glitter'] = True
-        else:
-            self.percepts['Glitter'] = False
-        if 'B' in self.world[self.pos[0]][self.pos[1]].env:
-            self.percepts['Breeze'] = True
-        else:
-            self.percepts['Breeze'] = False
-        if 'S' in self.world[self.pos[0]][self.pos[1]].env:
-            self.percepts['Stench'] = True
-        else:
-            self.percepts['Stench'] = False
+        bits = self.world.percept_bits(self.pos)
+        self.percepts['Glitter'] = bool(bits & GLITTER)
+        self.percepts['Breeze'] = bool(bits & BREEZE)
+        self.percepts['Stench'] = bool(bits & STENCH)
     
     def pickup(self):
         '''Agent picks up gold'''
         self.gold += 1
-        self.world[self.pos[0]][self.pos[1]].type = '0'
-        self.world[self.pos[0]][self.pos[1]].env.remove('g')
+        self.world.set_type(self.pos, '0')
+        self.world.remove_percept(self.pos, 'g')
+        self.emit('pickup', self.pos)
     
     def face(self, point):
         '''Makes agent face the direction of the given point/node.'''
@@ -218,313 +1663,1261 @@ class Agent:
         self.percepts['Bump'] = not (self.world.in_world((self.pos[0] + self.orientation[0], self.pos[1] + self.orientation[1])))
         
         if not self.percepts['Bump']:
-            self.world[self.pos[0]][self.pos[1]].type = '0'
+            self.world.set_type(self.pos, '0')
             self.pos = (self.pos[0] + self.orientation[0], self.pos[1] + self.orientation[1])
-            print('Moving to:', self.pos)
+            self.steps += 1
             
-            if self.pos in self.world.wumpus or self.pos in self.world.pits:
-                print('Death')
-                exit(0)
+            if self.world.is_hazard(self.pos):
+                self.emit('move', self.pos)
+                self.emit('death', self.pos)
+                raise EpisodeOver('died')
             
-            self.world[self.pos[0]][self.pos[1]].type = 'A'
+            self.world.set_type(self.pos, 'A')
+            self.emit('move', self.pos)
             
-            if not self.pos in self.visited:
+            if not self.pos in self.visited_set:
                 self.update_on_move()
-                self.world[self.pos[0]][self.pos[1]].markers = 'V'
-                self.world[self.pos[0]][self.pos[1]].score = float('inf')
-                self.tentative_nodes.remove((self.pos[0], self.pos[1]))
+                self.knowledge.visit(self.pos)
+                if (self.pos[0], self.pos[1]) in self.tentative_nodes: # a freshly killed wumpus' cell may never have been a tentative node
+                    self.tentative_nodes.remove((self.pos[0], self.pos[1]))
+                self.first_visited.setdefault(('row', self.pos[0]), (len(self.visited), self.pos))
+                self.first_visited.setdefault(('col', self.pos[1]), (len(self.visited), self.pos))
                 self.visited.append((self.pos[0], self.pos[1]))
+                self.visited_set.add((self.pos[0], self.pos[1]))
+                self.paths.add(self.pos)
         else:
-            print('B U M P') # this is a placeholder, this part of the code will never be reached as the agent never attempts to step out of the world boundary, but was created nonetheless as the practical sheet demanded it.
+            self.emit('bump', self.pos) # this is a placeholder, this part of the code will never be reached as the agent never attempts to step out of the world boundary, but was created nonetheless as the practical sheet demanded it.
     
     def shoot_at(self, pos):
         '''Makes agent shoot at the given position'''
         self.face(pos)
-        arrow_pos = (self.pos[0] + self.orientation[0], self.pos[1] + self.orientation[1])
+        self.emit('shoot', pos)
+        self.percepts['Scream'] = False # a scream is only heard right after the arrow that caused it
+        adj = self.adjacency
+        n = adj.dimensions
+        arrow_pos = self.pos
         
-        while self.world.in_world(arrow_pos):
+        for j in adj.ray(self.knowledge.index(self.pos), self.orientation):
+            arrow_pos = divmod(j, n)
             if self.world[arrow_pos[0]][arrow_pos[1]].type == 'W':
                 self.percepts['Scream'] = True
-                self.world[arrow_pos[0]][arrow_pos[1]].type = '0'
-                self.world.wumpus.remove(arrow_pos)
-                for i in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-                    if self.world.in_world((arrow_pos[0] + i[0], arrow_pos[1] + i[1])):
-                        if 'S' in self.world[arrow_pos[0] + i[0]][arrow_pos[1] + i[1]].env:
-                            self.world[arrow_pos[0] + i[0]][arrow_pos[1] + i[1]].env.remove('S')
+                self.world.set_type(arrow_pos, '0')
+                self.world.remove_wumpus(arrow_pos)
+                for k in adj.neighbours(j):
+                    x, y = divmod(k, n)
+                    if 'S' in self.world[x][y].env:
+                        self.world.remove_percept((x, y), 'S')
                 break
-            arrow_pos = (arrow_pos[0] + self.orientation[0], arrow_pos[1] + self.orientation[1])
         
         self.arrows -= 1
         if self.percepts['Scream']:
-            print('Wumpus killed.')
-            if self.world[arrow_pos[0]][arrow_pos[1]] in self.tentative_nodes:
-                self.world[arrow_pos[0]][arrow_pos[1]].markers = 'OK'
-                self.world[arrow_pos[0]][arrow_pos[1]].score = float('-inf')
-                for i in self.tentative_nodes:
-                    while 'W?' in self.world[i[0]][i[1]].markers:
-                        self.world[i[0]][i[1]].markers.remove('W?')
-                        if self.world[i[0]][i[1]].score > len(self.world[i[0]][i[1]].markers):
-                            self.world[i[0]][i[1]].score = len(self.world[i[0]][i[1]].markers)
-            print(self.world, end='\n\n')
+            self.emit('scream', arrow_pos)
             self.follow_path(self.find_path(arrow_pos))
         else:
-            print('Wumpus missed.')
+            self.emit('miss', pos)
     
     def follow_path(self, path):
         '''Makes agent follow a given path'''
+        if path is None: # goal can't be reached through known-safe nodes
+            raise EpisodeOver('stuck')
         for node in path:
             self.face(node.pos)
             self.go_forward()
-            print(self.world, end='\n\n')
-            sleep(1)
     
     def update_on_move(self):
         '''Updates nodes as agent moves into a new space'''
-        for i in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-            if self.world.in_world((self.pos[0] + i[0], self.pos[1] + i[1])):
-                if type(self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers) != str:
-                    for marker in self.world[self.pos[0]][self.pos[1]].markers:
-                        if marker in self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers:
-                            self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers.append(marker)
+        kb = self.knowledge
+        i = kb.index(self.pos)
+        if kb.state[i] != KnowledgeBase.OPEN:
+            return
+        for j in self.adjacency.diagonals(i):
+            if kb.state[j] == KnowledgeBase.OPEN: # evidence shared with the node just entered is reinforced
+                kb.set_evidence(j, kb.pits[j] + kb.pits[i] if kb.pits[j] != 0 else 0, kb.wumpus[j] + kb.wumpus[i] if kb.wumpus[j] != 0 else 0)
     
     def update_knowledge(self):
         '''Main function responsible for calculating scores for each node'''
-        markers = list()
-        if self.percepts['Breeze']:
-            markers.append('P?')
-        if self.percepts['Stench']:
-            markers.append('W?')
+        kb = self.knowledge
+        adj = self.adjacency
+        n = adj.dimensions
+        pit, wumpus = int(self.percepts['Breeze']), int(self.percepts['Stench'])
+        safe = not (pit or wumpus)
         
-        if len(markers) == 0:
-            markers = 'OK'
-        
-        temp_markers = None
+        cleared = None # evidence held by the last node that turned out to be safe
         update_nodes = list()
         adjacent_nodes = list()
         
         # applying markers
-        for i in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-            if self.world.in_world((self.pos[0] + i[0], self.pos[1] + i[1])):
-                if type(self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers) != str:
-                    if type(markers) == str:
-                        if type(self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers) == list and len(self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers) != 0:
-                            temp_markers = self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers
-                            update_nodes.append((self.pos[0] + i[0], self.pos[1] + i[1]))
-                        self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers = markers
-                    else:
-                        for j in markers:
-                            self.world[self.pos[0] + i[0]][self.pos[1] + i[1]].markers.append(j)
-                    if not (self.pos[0] + i[0], self.pos[1] + i[1]) in self.tentative_nodes and not (self.pos[0] + i[0], self.pos[1] + i[1]) in self.visited:
-                        self.tentative_nodes.append((self.pos[0] + i[0], self.pos[1] + i[1]))
-                    adjacent_nodes.append((self.pos[0] + i[0], self.pos[1] + i[1]))
+        for j in adj.neighbours(kb.index(self.pos)):
+            if kb.state[j] == KnowledgeBase.OPEN:
+                npos = divmod(j, n)
+                if safe:
+                    if kb.pits[j] + kb.wumpus[j] != 0:
+                        cleared = (kb.pits[j], kb.wumpus[j])
+                        update_nodes.append(j)
+                    kb.set_state(j, KnowledgeBase.OK)
+                else:
+                    kb.set_evidence(j, kb.pits[j] + pit, kb.wumpus[j] + wumpus)
+                if not npos in self.tentative_nodes and not npos in self.visited_set:
+                    self.tentative_nodes.append(npos)
+                adjacent_nodes.append(j)
         
         # updating markers if a node that was thought to be dangerous previously turned out to be safe.
-        if len(update_nodes) != 0:
-            for node in update_nodes:
-                for i in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                    if self.world.in_world((node[0] + i[0], node[1] + i[1])):
-                        if type(self.world[node[0] + i[0]][node[1] + i[1]].markers) != str:
-                            temp = deepcopy(self.world[node[0] + i[0]][node[1] + i[1]].markers)
-                            for marker in temp:
-                                if marker in temp_markers:
-                                    self.world[node[0] + i[0]][node[1] + i[1]].markers.append(marker)
+        for node in update_nodes:
+            for j in adj.diagonals(node):
+                if kb.state[j] == KnowledgeBase.OPEN:
+                    kb.set_evidence(j, kb.pits[j] * 2 if cleared[0] != 0 else kb.pits[j], kb.wumpus[j] * 2 if cleared[1] != 0 else kb.wumpus[j])
         
         # updating scores
-        for i in range(len(adjacent_nodes)):
-            if type(self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].markers) == str:
-                self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].score = float('-inf')
-            else:
-                if len(self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].markers) == 1:
-                    self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].score = 1
-                else:
-                    count = dict()
-                    
-                    for j in self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].markers:
-                        if count.get(j, -1) == -1:
-                            count[j] = 1
-                        else:
-                            count[j] += 1
-                    
-                    count = dict(sorted(count.items(), key=lambda item: item[1]))
-                    
-                    if len(count) == 1:
-                        self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].score = list(count.values())[0]
-                        
-                        for j in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                            if self.world.in_world((adjacent_nodes[i][0] + j[0], adjacent_nodes[i][1] + j[1])):
-                                if type(self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].markers) != str:
-                                    self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].score -= 0.5
-                    else:
-                        if count[list(count.keys())[0]] == count[list(count.keys())[1]]:
-                            self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].score = 1.5
-                        else:
-                            self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].markers.remove(list(count.keys())[0])
-                            self.world[adjacent_nodes[i][0]][adjacent_nodes[i][1]].score = 2
-                            
-                            for j in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                                if self.world.in_world((adjacent_nodes[i][0] + j[0], adjacent_nodes[i][1] + j[1])):
-                                    if type(self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].markers) != str and list(count.keys())[0] in self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].markers:
-                                        self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].markers.append(list(count.keys())[0])
-                                        self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].score = len(self.world[adjacent_nodes[i][0] + j[0]][adjacent_nodes[i][1] + j[1]].markers)
+        for j in adjacent_nodes:
+            pits, wumpus = kb.pits[j], kb.wumpus[j]
+            if kb.state[j] != KnowledgeBase.OPEN:
+                kb.set_score(j, float('-inf'))
+            elif pits + wumpus == 1:
+                kb.set_score(j, 1)
+            elif pits == 0 or wumpus == 0: # only one kind of danger, the more hints the riskier
+                kb.set_score(j, pits + wumpus)
+                for k in adj.diagonals(j):
+                    if kb.state[k] == KnowledgeBase.OPEN:
+                        kb.set_score(k, kb.scores[k] - 0.5)
+            elif pits == wumpus:
+                kb.set_score(j, 1.5)
+            else: # the weaker hint loses a vote here and is reinforced on the diagonal nodes that share it
+                pit_weaker = pits < wumpus
+                kb.set_evidence(j, pits - pit_weaker, wumpus - (not pit_weaker))
+                kb.set_score(j, 2)
+                for k in adj.diagonals(j):
+                    if kb.state[k] == KnowledgeBase.OPEN and (kb.pits[k] if pit_weaker else kb.wumpus[k]) != 0:
+                        kb.set_evidence(k, kb.pits[k] + pit_weaker, kb.wumpus[k] + (not pit_weaker))
+                        kb.set_score(k, kb.pits[k] + kb.wumpus[k])
     
     def closest_node(self, node):
         '''Finds the closest visited node to the given node.'''
-        move_direction = 1
-        temp_pos = self.pos
-        if abs(self.pos[0] - node[0]) <= abs(self.pos[1] - node[1]):
-            while True:
-                temp_pos = (temp_pos[0] + move_direction, temp_pos[1])
-                if not self.world.in_world(temp_pos):
-                    move_direction = -(move_direction)
-                    temp_pos = self.pos
-                    if move_direction == 1:
-                        break
-                    else:
-                        continue
-                if temp_pos[0] - node[0] == 0 and temp_pos in self.visited:
-                    return temp_pos
-        while True:
-            temp_pos = (temp_pos[0], temp_pos[1] + move_direction)
-            if not self.world.in_world(temp_pos):
-                move_direction = -(move_direction)
-                temp_pos = self.pos
-                if move_direction == 1:
-                    break
-                else:
-                    continue
-            if temp_pos[1] - node[1] == 0 and temp_pos in self.visited:
-                return temp_pos
-        while True:
-            temp_pos = (temp_pos[0] + move_direction, temp_pos[1])
-            if not self.world.in_world(temp_pos):
-                move_direction = -(move_direction)
-                temp_pos = self.pos
-                if move_direction == 1:
-                    break
-                else:
-                    continue
-            if temp_pos[0] - node[0] == 0 and temp_pos in self.visited:
-                return temp_pos
-        for i in self.visited:
-            if i[0] - node[0] == 0 or i[1] - node[1] == 0:
-                return i
+        # where the agent's column meets the node's row, or its row meets the node's column: checked first is the one
+        # reached by moving along the axis where the node is nearer
+        column, row = (node[0], self.pos[1]), (self.pos[0], node[1])
+        for pos in ((column, row) if abs(self.pos[0] - node[0]) <= abs(self.pos[1] - node[1]) else (row, column)):
+            if pos != self.pos and pos in self.visited_set:
+                return pos
+        # the earliest visited node sharing the node's row or column
+        candidates = [self.first_visited[key] for key in (('row', node[0]), ('col', node[1])) if key in self.first_visited]
+        if candidates:
+            return min(candidates)[1]
     
     def best_action(self):
         '''Returns the best possible action that the agent can perform'''
-        min_score = float('inf')
+        if len(self.tentative_nodes) == 0: # every reachable node has been explored without finding all the gold
+            raise EpisodeOver('stuck')
         
-        for i in self.tentative_nodes:
-            if min_score > self.world[i[0]][i[1]].score:
-                min_score = self.world[i[0]][i[1]].score
+        if self.profiler is not None:
+            self.profiler.count('frontier_size', len(self.tentative_nodes))
         
-        best_nodes = [i for i in self.tentative_nodes if self.world[i[0]][i[1]].score == min_score]
+        min_score = self.tentative_nodes.min_score()
+        best_nodes = self.tentative_nodes.best()
         
+        shot = None
         if self.arrows != 0:
-            wumpus_nodes = list()
-            if min_score >= 1:
-                for i in self.tentative_nodes:
-                    if 'W?' in self.world[i[0]][i[1]].markers:
-                        wumpus_nodes.append(i)
+            best_wumpus = None
+            if min_score >= 1: # every move is risky, so it may be worth shooting the likeliest wumpus instead
+                best_wumpus = self.tentative_nodes.riskiest_wumpus()
             
-            max_score = float('-inf')
-            if len(wumpus_nodes) != 0:
-                best_wumpus = None
-                for i in wumpus_nodes:
-                    if max_score < self.world[i[0]][i[1]].score:
-                        max_score = self.world[i[0]][i[1]].score
-                        best_wumpus = i
+            if best_wumpus is not None:
                 if self.pos[0] - best_wumpus[0] == 0 or self.pos[1] - best_wumpus[1] == 0:
-                    return ['Shoot', best_wumpus]
+                    shot = ['Shoot', best_wumpus]
                 else:
-                    return ['Shoot', best_wumpus, self.closest_node(best_wumpus)]
+                    shot = ['Shoot', best_wumpus, self.closest_node(best_wumpus)]
         
-        return ['Move', best_nodes[randint(0, len(best_nodes) - 1)]]
+        if self.planner is not None: # let rollouts on sampled worlds settle between the shot and the equally good moves
+            return self.planner.choose(self, ([shot] if shot is not None else []) + [['Move', node] for node in self.planner.moves(self)])
+        if shot is not None:
+            return shot
+        return ['Move', best_nodes[self.rng.randint(0, len(best_nodes) - 1)]]
+    
+    def cached_path(self, goal):
+        '''Returns the cells of a shortest path to the goal from the cached distance maps, or None if none of them covers it.'''
+        start = self.pos
+        if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) == 1:
+            return [goal]
+        dmap = self.paths.get(goal)
+        if dmap is not None:
+            return dmap.walk(start)
+        dmap = self.paths.get(start)
+        if dmap is not None: # walk back from the goal, entering it from its closest visited neighbour
+            via = goal
+            if not goal in dmap.dist:
+                n = self.adjacency.dimensions
+                via = min((divmod(j, n) for j in self.adjacency.neighbours(self.knowledge.index(goal)) if divmod(j, n) in dmap.dist),
+                          key=dmap.dist.get, default=None)
+                if via is None:
+                    return None
+            path = dmap.walk(via)
+            path.reverse()
+            path = path[1:] + [via]
+            if via != goal:
+                path.append(goal)
+            return path
+        if goal in self.visited_set: # a visited node the agent heads back to, likely again
+            return self.paths.build(goal).walk(start)
+        return None
     
     def find_path(self, goal):
-        '''Finds the optimal path to the given goal node'''
-        graph = deepcopy(self.visited)
-        graph.append(goal)
-        AVAILABLE = AugList(list())
-        VISITED = AugList(list())
-        curr_node = GraphNode(self.pos, h=(abs(self.pos[0] - goal[0]) + abs(self.pos[1] - goal[1])))
-        AVAILABLE.append(curr_node)
-        
-        while len(AVAILABLE) != 0:
-            curr_node = AVAILABLE[0]
-            for node in AVAILABLE:
-                if node.f < curr_node.f:
-                    curr_node = node
-            
-            VISITED.append(curr_node)
+        '''Finds the optimal path to the given goal node, from the agent's PathCache if it can and using A* over the visited nodes otherwise.'''
+        path = self.cached_path(goal) if goal != self.pos else None
+        if self.profiler is not None:
+            self.profiler.count('path_cache_hits', int(path is not None))
+        if path is not None:
+            if self.profiler is not None:
+                self.profiler.count('path_length', len(path))
+            nodes = list()
+            prev = None
+            for k, pos in enumerate(path):
+                prev = GraphNode(pos, parent=prev, g=k + 1, h=abs(pos[0] - goal[0]) + abs(pos[1] - goal[1]))
+                nodes.append(prev)
+            return nodes
+        
+        n = self.adjacency.dimensions
+        if self.arena is None:
+            self.arena = SearchArena(n * n)
+        arena = self.arena
+        search = arena.begin()
+        g, parent, seen, closed, bits = arena.g, arena.parent, arena.seen, arena.closed, arena.bits
+        state, neighbours = self.knowledge.state, self.adjacency.neighbours # a cell is in the visited region iff its knowledge state says VISITED
+        mask, size = (1 << bits) - 1, n * n
+        gx, gy = goal
+        start = self.knowledge.index(self.pos)
+        target = self.knowledge.index(goal)
+        g[start], parent[start], seen[start] = 0, -1, search
+        expanded = 0
+        order = 0 # breaks the remaining ties in insertion order
+        available = [(abs(self.pos[0] - gx) + abs(self.pos[1] - gy)) << 3 * bits | size << 2 * bits | start]
+        
+        while available:
+            j = heappop(available) & mask
+            if closed[j] == search: # stale entry left behind by a cheaper route
+                continue
             
-            if curr_node.pos == goal:
+            if j == target:
+                if self.profiler is not None:
+                    self.profiler.count('astar_expanded', expanded + 1)
+                    self.profiler.count('path_length', g[j])
                 path = list()
-                while True:
-                    if not curr_node.parent:
-                        break
-                    path.insert(0, curr_node)
-                    curr_node = curr_node.parent
-                return path
+                while parent[j] != -1:
+                    path.append(j)
+                    j = parent[j]
+                path.reverse()
+                
+                nodes = list()
+                prev = None
+                for j in path:
+                    pos = divmod(j, n)
+                    prev = GraphNode(pos, parent=prev, g=g[j], h=abs(pos[0] - gx) + abs(pos[1] - gy))
+                    nodes.append(prev)
+                return nodes
             
-            neighbours = list()
-            for i in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-                npos = (curr_node.pos[0] + i[0], curr_node.pos[1] + i[1])
-                if self.world.in_world(npos):
-                    if npos in graph:
-                        neighbours.append(GraphNode(npos, g=1, h=abs(npos[0] - goal[0]) + abs(npos[1] - goal[1])))
-            
-            for node in neighbours:
-                if not VISITED.inlist(node)[0]:
-                    if not AVAILABLE.inlist(node)[0]:
-                        node.g += curr_node.g
-                        node.f = node.g + node.h
-                        node.parent = curr_node
-                        AVAILABLE.append(node)
-                    else:
-                        open_node = AVAILABLE[AVAILABLE.inlist(node)[1]]
-                        if open_node.g > node.g + curr_node.g:
-                            open_node.g = node.g + curr_node.g
-                            open_node.f = open_node.g + open_node.h
-                            open_node.parent = curr_node
-            
-            AVAILABLE.remove(curr_node)
+            closed[j] = search
+            expanded += 1
+            ng = g[j] + 1
+            for k in neighbours(j):
+                if closed[k] == search or not (state[k] == KnowledgeBase.VISITED or k == target):
+                    continue
+                if seen[k] != search or ng < g[k]:
+                    g[k], parent[k], seen[k] = ng, j, search
+                    order += 1
+                    x, y = divmod(k, n)
+                    # f-score first, then the deepest (largest g) among equal f-scores, then insertion order
+                    heappush(available, ((ng + abs(x - gx) + abs(y - gy)) << bits | size - ng) << 2 * bits | order << bits | k)
+        
+        if self.profiler is not None:
+            self.profiler.count('astar_expanded', expanded)
     
     def escape(self):
         '''Lets agent esacpe safely from the world.'''
         self.follow_path(self.find_path(self.escape_point))
-        print('Escaped.')
-        exit(0)
+        self.emit('escape', self.pos)
+        return True
+    
+    def act(self):
+        '''Perceives, updates the knowledge base and performs the best action. Returns True once the agent has escaped with all the gold.'''
+        self.check_percepts()
+        
+        if self.percepts['Glitter']:
+            self.pickup()
+            if self.gold == len(self.world.gold):
+                self.objectives['Get Gold'] = True
+                return self.escape()
+        
+        self.update_knowledge()
+        self.check_progress()
+        self.perform(self.best_action())
+        return False
+    
+    def check_progress(self):
+        '''Ends the episode as stuck once it is over budget, or when the agent is about to decide in a state it has decided in before.
+        
+        Decisions are deterministic given the state (bar random tie-breaks), so a repeated state means the agent is going
+        round in circles. The state is hashed from the knowledge base's running Zobrist hash plus the agent's position,
+        orientation, arrows and gold, so the check costs the same on any world size.'''
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            raise EpisodeOver('stuck')
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise EpisodeOver('stuck')
+        state = hash((self.knowledge.hash, self.pos, self.orientation, self.arrows, self.gold))
+        if state in self.seen:
+            raise EpisodeOver('stuck')
+        self.seen[state] = None
+    
+    def perform(self, action):
+        '''Carries out an action as returned by best_action.'''
+        if action[0] == 'Shoot':
+            if len(action) == 2:
+                self.shoot_at(action[1])
+            else:
+                if action[2] is None: # no visited node lines up with the wumpus
+                    raise EpisodeOver('stuck')
+                self.follow_path(self.find_path(action[2]))
+                self.shoot_at(action[1])
+        else:
+            self.follow_path(self.find_path(action[1]))
     
     def do_actions(self):
         '''Performs all actions the agent can do'''
         while True:
-            self.check_percepts()
-            
-            if self.percepts['Glitter']:
-                self.pickup()
-                if self.gold == len(self.world.gold):
-                    self.objectives['Get Gold'] = True
-                    return self.escape()
-            
-            self.update_knowledge()
-            
-            best_action = self.best_action()
-            if best_action[0] == 'Shoot':
-                if len(best_action) == 2:
-                    self.shoot_at(best_action[1])
+            if self.act():
+                return True
+    
+    def run(self):
+        '''Plays out a whole episode and returns its Outcome, without ever exiting the interpreter.'''
+        arrows = self.arrows
+        if self.max_seconds is not None:
+            self.deadline = perf_counter() + self.max_seconds
+        try:
+            self.do_actions()
+            result = 'solved'
+        except EpisodeOver as e:
+            result = e.result
+        return Outcome(result, self.steps, arrows - self.arrows)
+
+class Lookahead():
+    '''Monte Carlo planner that picks among the agent's best candidate actions by simulating them on sampled worlds.
+    
+    Every round draws a hidden world consistent with everything the agent has perceived so far (each stench or breeze it
+    felt has a wumpus or pit next to it, no hazard sits next to a cell where it felt none, and the counts match), then
+    plays every candidate action on it followed by up to `horizon` decisions of the agent's own heuristic. The agent and
+    the sampled world are rewound with a snapshot after each rollout. Rounds continue until `budget` milliseconds have
+    passed (or `samples` rounds were played), and the action with the best mean value wins. By default only the action
+    itself is simulated: on small boards the heuristic's own random tie-breaks add more noise than longer rollouts add signal.'''
+    SOLVED, ALIVE, STUCK, DIED = 1.0, 0.5, 0.25, 0.0 # value of a rollout by how it ended
+    
+    def __init__(self, budget=10.0, horizon=0, samples=None, width=4, rng=None):
+        self.budget = budget
+        self.horizon = horizon
+        self.width = width
+        self.samples = samples
+        self.rng = rng or random.Random()
+        self.decisions = 0
+        self.rollouts = 0
+        self.seconds = 0.0
+    
+    def seed(self, seed):
+        self.rng.seed('lookahead-%d' % seed)
+    
+    def moves(self, agent):
+        '''Returns the `width` frontier nodes the heuristic rates safest, in the order it would prefer them.'''
+        frontier = agent.tentative_nodes
+        return sorted(frontier.order, key=lambda pos: (frontier.filed[pos], frontier.order[pos]))[:self.width]
+    
+    def hints(self, agent, bit):
+        '''Returns the cells a hazard of the given percept bit can't be on, and for every visited cell where it was
+        perceived, the cells that could explain it.'''
+        world, adj = agent.world, agent.adjacency
+        n = adj.dimensions
+        ruled_out = set(agent.visited_set)
+        covers = list()
+        for x, y in agent.visited_set:
+            neighbours = [divmod(j, n) for j in adj.neighbours(x * n + y)]
+            if world.percept_bits((x, y)) & bit:
+                covers.append(neighbours)
+            else:
+                ruled_out.update(neighbours)
+        return ruled_out, [[pos for pos in cover if not pos in ruled_out] for cover in covers]
+    
+    def place(self, count, ruled_out, covers, taken, n):
+        '''Draws `count` hazard positions explaining every cover, or None if this draw can't.'''
+        chosen = set()
+        for cover in self.rng.sample(covers, len(covers)):
+            if not any(pos in chosen for pos in cover):
+                cover = [pos for pos in cover if not pos in taken]
+                if not cover:
+                    return None
+                chosen.add(self.rng.choice(cover))
+        if len(chosen) > count:
+            return None
+        for _ in range(64 * n * n):
+            if len(chosen) == count:
+                return chosen
+            pos = (self.rng.randrange(n), self.rng.randrange(n))
+            if not pos in ruled_out and not pos in taken:
+                chosen.add(pos)
+        return None
+    
+    def sample_world(self, agent, wumpus_hints, pit_hints, tries=32):
+        '''Returns a World consistent with the agent's percepts, or None if none was found in `tries` draws.'''
+        world = agent.world
+        n = len(world)
+        collected = [pos for pos in world.gold if pos in agent.visited_set]
+        for _ in range(tries):
+            wumpus = self.place(len(world.wumpus), *wumpus_hints, set(), n)
+            if wumpus is None:
+                continue
+            pits = self.place(len(world.pits), pit_hints[0], pit_hints[1], wumpus, n)
+            if pits is None:
+                continue
+            gold = self.place(len(world.gold) - len(collected), agent.visited_set, [], wumpus | pits, n)
+            if gold is None:
+                continue
+            sample = World(n, 0, 0, 0)
+            sample.place_layout(sorted(wumpus), sorted(pits), sorted(gold))
+            sample.gold.extend(collected) # the gold already picked up still counts towards the goal
+            return sample
+        return None
+    
+    def rollout(self, agent, action):
+        '''Plays the action and then the agent's heuristic for up to `horizon` decisions, returning how well it went.'''
+        try:
+            agent.perform(action)
+            for _ in range(self.horizon):
+                if agent.act():
+                    return Lookahead.SOLVED
+            return Lookahead.ALIVE
+        except EpisodeOver as e:
+            return Lookahead.DIED if e.result == 'died' else Lookahead.STUCK
+    
+    def choose(self, agent, candidates):
+        '''Returns the candidate action with the best mean rollout value, the first one on ties.'''
+        if len(candidates) == 1:
+            return candidates[0]
+        start = perf_counter()
+        deadline = start + self.budget / 1000
+        real_world, log, sink, profiler, rng = agent.world, agent.knowledge.log, agent.sink, agent.profiler, agent.rng
+        agent.planner, agent.sink, agent.profiler, agent.rng = None, None, None, self.rng # rollouts play the plain heuristic, silently
+        if profiler is not None: # the agent's phases stay wrapped, so their timers are switched off instead
+            profiler.enabled = False
+        wumpus_hints, pit_hints = self.hints(agent, STENCH), self.hints(agent, BREEZE)
+        values = [0.0] * len(candidates)
+        rounds = 0
+        try:
+            while perf_counter() < deadline and (self.samples is None or rounds < self.samples):
+                sample = self.sample_world(agent, wumpus_hints, pit_hints)
+                if sample is None:
+                    break
+                sample.log = log
+                agent.world = sample
+                snapshot = agent.snapshot()
+                for k, action in enumerate(candidates):
+                    values[k] += self.rollout(agent, action)
+                    agent.restore(snapshot)
+                agent.world = real_world
+                rounds += 1
+        finally:
+            agent.world, agent.knowledge.log, agent.paths.log = real_world, log, log
+            agent.planner, agent.sink, agent.profiler, agent.rng = self, sink, profiler, rng
+            if profiler is not None:
+                profiler.enabled = True
+        self.decisions += 1
+        self.rollouts += rounds * len(candidates)
+        self.seconds += perf_counter() - start
+        if rounds == 0: # out of time before a single round, fall back to the heuristic's own pick
+            if candidates[0][0] == 'Shoot':
+                return candidates[0]
+            best_nodes = agent.tentative_nodes.best()
+            return ['Move', best_nodes[agent.rng.randint(0, len(best_nodes) - 1)]]
+        return candidates[max(range(len(candidates)), key=lambda k: (values[k], -k))]
+
+class WumpusEnv():
+    '''Step-by-step Wumpus World for external policies, in the style of a Gym environment.
+    
+    reset(seed) draws the same world as the seeded batch episode with that seed and returns the first observation.
+    step(action) plays one of FORWARD, LEFT, RIGHT, SHOOT, GRAB or CLIMB and returns (observation, reward, done).
+    Observations pack the agent's percepts into an int: STENCH, BREEZE and GLITTER as stored in the world's cells, then
+    Lockstep.BUMP and Lockstep.SCREAM, which like the Agent's percepts stay set until the next move or shot. Moves and
+    shots follow Agent.go_forward and Agent.shoot_at, which check_engines (--check-engines) verifies step by step.
+    The world is held in a CompactWorld, so a step reads and writes a few bytes and allocates nothing but the tuple it
+    returns.'''
+    FORWARD, LEFT, RIGHT, SHOOT, GRAB, CLIMB = range(6)
+    ACTIONS = ('forward', 'left', 'right', 'shoot', 'grab', 'climb')
+    STEP, SHOT, DEATH, ESCAPE = -1, -10, -1000, 1000 # rewards: every action, an arrow, dying, climbing out with all the gold
+    WUMPUS, PIT, AGENT = [CompactGrid.TYPES.index(t) << 3 for t in ('W', ' ', 'A')]
+    
+    def __init__(self, dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, solvable=False):
+        self.params = (dimensions, cwumpus, cpits, cgold)
+        self.solvable = solvable
+        self.initial_arrows = arrows
+        self.rng = random.Random()
+        self.dx = (-1, 0, 1, 0) # by facing: N, E, S, W
+        self.dy = (0, 1, 0, -1)
+        self.world = None
+        self.done = True
+    
+    def reset(self, seed=None, world=None):
+        '''Starts an episode on the world generated from `seed`, or on the given world, and returns the first observation.'''
+        if world is None:
+            self.rng.seed(seed)
+            world = CompactWorld(*self.params, solvable=self.solvable, arrows=self.initial_arrows, rng=self.rng)
+        elif not isinstance(world, CompactWorld):
+            compact = CompactWorld(len(world), 0, 0, 0)
+            compact.place_layout(world.wumpus, world.pits, world.gold)
+            world = compact
+        self.world = world
+        self.cells = world.world.cells
+        self.n = n = len(world)
+        self.x, self.y = n - 1, 0
+        self.facing = 1 # east, like Agent
+        self.arrows = self.initial_arrows
+        self.gold = 0
+        self.gold_total = len(world.gold)
+        self.bump = self.scream = 0
+        self.steps = 0
+        self.done = False
+        self.cells[(n - 1) * n] = (self.cells[(n - 1) * n] & 0xC7) | WumpusEnv.AGENT
+        return self.cells[(n - 1) * n] & 0x7
+    
+    def step(self, action):
+        if self.done:
+            raise ValueError('the episode is over, call reset()')
+        cells, n = self.cells, self.n
+        reward = WumpusEnv.STEP
+        
+        if action == WumpusEnv.FORWARD:
+            x, y = self.x + self.dx[self.facing], self.y + self.dy[self.facing]
+            if 0 <= x < n and 0 <= y < n:
+                self.bump = 0
+                cells[self.x * n + self.y] &= 0xC7
+                self.x, self.y = x, y
+                self.steps += 1
+                i = x * n + y
+                if cells[i] & 0x38 == WumpusEnv.WUMPUS or cells[i] & 0x38 == WumpusEnv.PIT:
+                    self.done = True
+                    reward = WumpusEnv.DEATH
                 else:
-                    self.follow_path(self.find_path(best_action[2]))
-                    self.shoot_at(best_action[1])
+                    cells[i] = (cells[i] & 0xC7) | WumpusEnv.AGENT
             else:
-                self.follow_path(self.find_path(best_action[1]))
+                self.bump = Lockstep.BUMP
+        elif action == WumpusEnv.LEFT:
+            self.facing = (self.facing - 1) % 4
+        elif action == WumpusEnv.RIGHT:
+            self.facing = (self.facing + 1) % 4
+        elif action == WumpusEnv.SHOOT:
+            if self.arrows:
+                self.arrows -= 1
+                reward = WumpusEnv.SHOT
+                self.scream = 0
+                dx, dy = self.dx[self.facing], self.dy[self.facing]
+                x, y = self.x + dx, self.y + dy
+                while 0 <= x < n and 0 <= y < n:
+                    if cells[x * n + y] & 0x38 == WumpusEnv.WUMPUS:
+                        self.scream = Lockstep.SCREAM
+                        cells[x * n + y] &= 0xC7
+                        if x > 0:
+                            cells[x * n + y - n] &= ~STENCH & 0xFF
+                        if x < n - 1:
+                            cells[x * n + y + n] &= ~STENCH & 0xFF
+                        if y > 0:
+                            cells[x * n + y - 1] &= ~STENCH & 0xFF
+                        if y < n - 1:
+                            cells[x * n + y + 1] &= ~STENCH & 0xFF
+                        break
+                    x, y = x + dx, y + dy
+        elif action == WumpusEnv.GRAB:
+            i = self.x * n + self.y
+            if cells[i] & GLITTER:
+                self.gold += 1
+                cells[i] &= 0xC7 & ~GLITTER
+        elif action == WumpusEnv.CLIMB:
+            if self.x == n - 1 and self.y == 0:
+                self.done = True
+                if self.gold == self.gold_total:
+                    reward = WumpusEnv.ESCAPE
+        else:
+            raise ValueError('unknown action ' + repr(action))
+        
+        return (cells[self.x * n + self.y] & 0x7) | self.bump | self.scream, reward, self.done
+    
+    def render(self):
+        return str(self.world)
 
-if __name__ == "__main__":
-    world = World(world_lst=lst)
-    agent = Agent(world)
+def run_env(steps, dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, seed=0):
+    '''Plays `steps` random actions through a WumpusEnv, resetting it on the next seed whenever an episode ends, and
+    returns the episode count and steps per second. The actions are drawn up front so only the environment is timed.'''
+    env = WumpusEnv(dimensions, cwumpus, cpits, cgold, arrows)
+    rng = random.Random(seed)
+    actions = [rng.choice((0, 0, 0, 1, 2, 3, 4, 5)) for _ in range(steps)]
+    episodes = solved = 0
+    
+    start = perf_counter()
+    env.reset(seed)
+    for action in actions:
+        _, reward, done = env.step(action)
+        if done:
+            episodes += 1
+            solved += reward == WumpusEnv.ESCAPE
+            env.reset(seed + episodes)
+    elapsed = perf_counter() - start
+    
+    return {'steps' : steps, 'episodes' : episodes, 'solved' : solved, 'seconds' : elapsed,
+            'steps_per_sec' : steps / elapsed if elapsed > 0 else float('inf')}
+
+def check_engines(agents, steps, dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, seed=0):
+    '''Plays the same random actions on `agents` seeded worlds for `steps` rounds through Agent's primitives, Lockstep
+    and WumpusEnv side by side. Returns a (round, agent, engine) triple for the first step on which Lockstep or WumpusEnv
+    disagrees with the Agent about being alive, the position, facing, arrows, gold, steps, percepts or the world's cells;
+    an agent is no longer followed after it dies or after a disagreement.'''
+    worlds = generate_worlds(agents, dimensions, cwumpus, cpits, cgold, seed=seed)
+    engine = Lockstep(worlds, arrows)
+    envs, players = [], []
+    for k in range(agents):
+        env = WumpusEnv(dimensions, arrows=arrows)
+        env.reset(world=worlds.world(k, compact=True))
+        envs.append(env)
+        agent = Agent(worlds.world(k), arrows, verbose=False)
+        agent.follow_path = lambda path: None # neither engine walks to a wumpus it has shot
+        players.append(agent)
+    alive = [True] * agents # agents still followed
+    rng = np.random.default_rng(seed)
+    n = dimensions
+    mismatches = []
+    
+    for t in range(steps):
+        actions = rng.integers(0, 5, agents).astype(np.int8)
+        engine.step(actions)
+        for k, agent in enumerate(players):
+            if not alive[k]:
+                continue
+            action = int(actions[k])
+            obs, _, done = envs[k].step(action)
+            try:
+                if action == Lockstep.FORWARD:
+                    agent.go_forward()
+                elif action == Lockstep.LEFT:
+                    agent.turn('L')
+                elif action == Lockstep.RIGHT:
+                    agent.turn('R')
+                elif action == Lockstep.SHOOT and agent.arrows > 0:
+                    agent.shoot_at((agent.pos[0] + agent.orientation[0], agent.pos[1] + agent.orientation[1]))
+                elif action == Lockstep.GRAB:
+                    agent.check_percepts()
+                    if agent.percepts['Glitter']:
+                        agent.pickup()
+            except EpisodeOver:
+                alive[k] = False
+            
+            if not alive[k]:
+                if engine.alive[k]:
+                    mismatches.append((t, k, 'Lockstep'))
+                if not done:
+                    mismatches.append((t, k, 'WumpusEnv'))
+                continue
+            found = len(mismatches)
+            agent.check_percepts()
+            percepts = agent.world.percept_bits(agent.pos) | agent.percepts['Bump'] * Lockstep.BUMP | agent.percepts['Scream'] * Lockstep.SCREAM
+            cells = bytes(CompactGrid.TYPES.index(agent.world[x][y].type) << 3 | agent.world.percept_bits((x, y)) for x in range(n) for y in range(n))
+            state = (True, agent.pos, agent.orientations.index(agent.orientation), agent.arrows, agent.gold, agent.steps, percepts, cells)
+            env = envs[k]
+            if state != (bool(engine.alive[k]), (int(engine.x[k]), int(engine.y[k])), int(engine.facing[k]), int(engine.arrows[k]),
+                         int(engine.gold[k]), int(engine.steps[k]), int(engine.percepts[k]), engine.cells[k].tobytes()):
+                mismatches.append((t, k, 'Lockstep'))
+            if state != (not done, (env.x, env.y), env.facing, env.arrows, env.gold, env.steps, obs, bytes(env.cells)):
+                mismatches.append((t, k, 'WumpusEnv'))
+            alive[k] = len(mismatches) == found
+    
+    return mismatches
+
+def play_episode(seed, dimensions=4, cwumpus=1, cpits=3, cgold=1, arrows=1, compact=False, worlds=None, solvable=False, corpus=None,
+                 profiler=None, sink=None, planner=None, max_steps=None, max_seconds=None):
+    '''Plays one headless episode on a random world generated from the given seed, optionally redrawn until it is solvable.
+    
+    If a WorldBatch is given, the world is taken from it instead, the batch's first world belonging to seed `worlds.seed`.
+    If a corpus path is given, `seed` is the index of the world in the corpus and the agent's RNG is the one Corpus.rng
+    rebuilds from its stored seed, so a replay plays out exactly like the batch episode the world came from.
+    A Profiler, if given, collects the per-phase timings of the episode, and a sink receives the agent's events. A Lookahead
+    planner, if given, is reseeded for the episode and picks the agent's actions. An episode running past max_steps moves
+    or max_seconds of wall time is ended and counted as stuck.'''
+    if corpus is not None:
+        corpus = open_corpus(corpus)
+        world = corpus.world(seed, compact)
+        rng = corpus.rng(seed)
+    else:
+        rng = random.Random(seed) # world placement and the agent's tie-breaking draw from the same seeded RNG
+        if worlds is not None:
+            world = worlds.world(seed - worlds.seed, compact)
+        else:
+            world = (CompactWorld if compact else World)(dimensions, cwumpus, cpits, cgold, solvable=solvable, arrows=arrows, rng=rng)
+    
+    if planner is not None:
+        planner.seed(seed)
+    agent = Agent(world, arrows, verbose=False, rng=rng, sink=sink, planner=planner, max_steps=max_steps, max_seconds=max_seconds)
+    if profiler is not None:
+        agent.instrument(profiler)
+    return agent.run()
+
+def play_shard(shard):
+    '''Plays every seed in [start, stop) and returns the tallies for the shard, with its per-episode columns under 'records' if asked.'''
+    start, stop, params = shard
+    params = dict(params)
+    records = params.pop('records', False)
+    if params.pop('bulk', False): # pre-generate the whole shard's worlds in one call
+        params['worlds'] = generate_worlds(stop - start, params.get('dimensions', 4), params.get('cwumpus', 1),
+                                           params.get('cpits', 3), params.get('cgold', 1), seed=start,
+                                           solvable=params.get('solvable', False), arrows=params.get('arrows', 1))
+    tally = {'solved' : 0, 'died' : 0, 'stuck' : 0, 'steps' : 0, 'arrows_used' : 0}
+    if params.pop('profile', False):
+        params['profiler'] = tally['profile'] = Profiler()
+    budget, horizon = params.pop('lookahead', None), params.pop('horizon', 0)
+    if budget is not None:
+        params['planner'] = Lookahead(budget, horizon)
+    if records:
+        columns = tally['records'] = {name : list() for name, _ in STORE_COLUMNS}
+        size = open_corpus(params['corpus']).dimensions if params.get('corpus') else params.get('dimensions', 4)
+        shard_profiler = params.get('profiler')
+    for seed in range(start, stop):
+        if records:
+            params['profiler'] = Profiler() # timed per episode, then folded into the shard's profile if one is kept
+        outcome = play_episode(seed, **params)
+        tally[outcome.result] += 1
+        tally['steps'] += outcome.steps
+        tally['arrows_used'] += outcome.arrows_used
+        if records:
+            for name, value in (('seed', seed), ('size', size), ('outcome', STORE_OUTCOMES.index(outcome.result)),
+                                ('steps', outcome.steps), ('shots', outcome.arrows_used)):
+                columns[name].append(value)
+            for phase in Profiler.PHASES:
+                columns[phase].append(params['profiler'].seconds.get(phase, 0.0))
+            if shard_profiler is not None:
+                shard_profiler += params['profiler']
+    if budget is not None:
+        planner = params['planner']
+        tally['decisions'], tally['rollouts'], tally['planning_seconds'] = planner.decisions, planner.rollouts, planner.seconds
+    return tally
+
+def merge_tally(totals, tally):
+    for key in tally:
+        if key in totals:
+            totals[key] += tally[key]
+        else:
+            totals[key] = tally[key]
 
-    print(world)
+def run_batch(episodes, seed=0, workers=None, shard_size=1000, store=None, **params):
+    '''Shards `episodes` seeded episodes across a process pool and returns the aggregated tallies.
+    
+    Episode i is played on the world generated from seed `seed + i`, so a batch is reproducible regardless of the number of workers.
+    `params` are passed on to play_episode (dimensions, cwumpus, cpits, cgold, arrows, compact, solvable, corpus, max_steps, max_seconds). With bulk=True each shard's
+    worlds are pre-generated by generate_worlds, seeded by the shard's first seed. With profile=True the totals also hold
+    the Profiler aggregated over every episode under 'profile'. With lookahead=MS every decision is planned by a Lookahead
+    with that budget (and the given horizon), and the totals also count its decisions, rollouts and planning time.
+    
+    With a store path, every shard's per-episode records are committed to that ResultStore as it finishes, seeds
+    already committed by an earlier, interrupted run of the same parameters are skipped (a store written with other
+    parameters is refused with a ValueError), and the totals also hold the store's running aggregates under 'store'. The tallies then only cover the episodes played by this call.'''
+    workers = workers or cpu_count()
+    ranges = [(seed, seed + episodes)]
+    if store is not None:
+        results = ResultStore(store, {key : params[key] for key in STORE_RUN if key in params})
+        ranges = results.pending(seed, seed + episodes)
+        params = dict(params, records=True)
+    shards = [(i, min(i + shard_size, stop), params) for first, stop in ranges for i in range(first, stop, shard_size)]
+    played = sum(stop - first for first, stop in ranges)
+    totals = {'solved' : 0, 'died' : 0, 'stuck' : 0, 'steps' : 0, 'arrows_used' : 0}
+    if params.get('profile'):
+        totals['profile'] = Profiler() # stays empty if the store already holds every seed
+    
+    def collect(tally):
+        if store is not None:
+            results.append(tally.pop('records'))
+        merge_tally(totals, tally)
+    
+    start = perf_counter()
+    try:
+        if workers == 1:
+            for tally in map(play_shard, shards):
+                collect(tally)
+        else:
+            with Pool(workers) as pool:
+                for tally in pool.imap_unordered(play_shard, shards):
+                    collect(tally)
+    finally:
+        if store is not None:
+            results.close()
+    elapsed = perf_counter() - start
+    
+    if store is not None:
+        totals['resumed'] = episodes - played
+        totals['store'] = results.stats.as_dict()
+    episodes = played
+    totals['episodes'] = episodes
+    totals['workers'] = workers
+    totals['seconds'] = elapsed
+    totals['episodes_per_sec'] = episodes / elapsed if elapsed > 0 else float('inf')
+    totals['solve_rate'] = totals['solved'] / episodes if episodes else 0.0
+    return totals
+
+def print_report(totals):
+    print('Episodes:', totals['episodes'], 'on', totals['workers'], 'worker(s) in', '%.2fs' % totals['seconds'], '(%.0f episodes/sec)' % totals['episodes_per_sec'])
+    print('Solved: %d  Died: %d  Stuck: %d' % (totals['solved'], totals['died'], totals['stuck']))
+    print('Solve rate: %.3f%%' % (totals['solve_rate'] * 100))
+    if 'decisions' in totals:
+        decisions = totals['decisions'] or 1
+        print('Lookahead: %d planned decisions, %.3f ms and %.1f rollouts per decision' % (totals['decisions'],
+              totals['planning_seconds'] * 1000 / decisions, totals['rollouts'] / decisions))
+    if 'store' in totals:
+        store = totals['store']
+        print('Store: %d episodes (%d skipped as already committed), solve rate %.3f%%, steps p50/p90/p99 %d/%d/%d' % (store['episodes'],
+              totals['resumed'], store['solve_rate'] * 100, store['steps_p50'], store['steps_p90'], store['steps_p99']))
+
+def print_tradeoff(budgets, results):
+    '''Prints how the solve rate of a batch changes with the lookahead budget.'''
+    print('%10s %12s %16s' % ('budget ms', 'solve rate', 'ms/decision'))
+    for budget, totals in zip(budgets, results):
+        print('%10g %11.3f%% %16.3f' % (budget, totals['solve_rate'] * 100, totals['planning_seconds'] * 1000 / (totals['decisions'] or 1)))
+
+def read_requests(rfile, defaults=None):
+    '''Yields the world descriptions read from a binary stream, one dict per world.
+    
+    The stream holds either JSON lines, each an object such as {"id": 7, "seed": 3, "size": 8, "pits": 6} where
+    "wumpus", "pits" and "gold" are counts or lists of [x, y] positions, or the contents of a corpus file written by
+    write_corpus (recognised by its magic), whose records are read until the stream ends. Missing keys are taken from
+    `defaults`. A JSON request keeps whatever id the client gave it and is tagged with its line number under "line",
+    which is never confused with an id; a line that isn't valid JSON yields a request carrying the error. Corpus
+    records take their index in the corpus as id.'''
+    defaults = defaults or dict()
+    if rfile.peek(len(CORPUS_MAGIC))[:len(CORPUS_MAGIC)] == CORPUS_MAGIC:
+        magic, width, dimensions, cwumpus, cpits, cgold = CORPUS_HEADER.unpack(rfile.read(CORPUS_HEADER.size))[:6]
+        record = corpus_record(width, cwumpus, cpits, cgold)
+        k = 0
+        while True:
+            data = rfile.read(record.size)
+            if len(data) < record.size:
+                return
+            fields = record.unpack(data)
+            cells = [list(divmod(i, dimensions)) for i in fields[1:]]
+            yield dict(defaults, id=k, seed=fields[0], size=dimensions, wumpus=cells[:cwumpus],
+                       pits=cells[cwumpus:cwumpus + cpits], gold=cells[cwumpus + cpits:])
+            k += 1
+    for k, line in enumerate(rfile):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            merged = dict(defaults)
+            merged.update(request)
+            merged['line'] = k
+            yield merged
+        except ValueError as e:
+            yield {'line' : k, 'error' : 'bad request: ' + str(e)}
+
+def check_request(request):
+    '''Returns why the world of a request can't be built, or None if it can.
+    
+    World placement redraws until every hazard and gold fits, so counts that can't fit would never return, and stall
+    every result queued behind them on the stream. Given positions must be distinct, and no hazard may sit on the
+    agent's start cell, which the agent would overwrite.'''
+    def is_int(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+    size = request.get('size', 4)
+    if not is_int(size) or size < 2:
+        return 'size must be an integer of at least 2'
+    arrows = request.get('arrows', 1)
+    if not is_int(arrows) or arrows < 0:
+        return 'arrows must be an integer of at least 0'
+    kinds = ('wumpus', 'pits', 'gold')
+    if any(isinstance(request.get(key), list) for key in kinds):
+        taken = set()
+        for key in kinds:
+            if isinstance(request.get(key), list):
+                for pos in request[key]:
+                    if not (isinstance(pos, list) and len(pos) == 2 and all(is_int(c) and 0 <= c < size for c in pos)):
+                        return '%s positions must be [x, y] pairs inside the %dx%d world' % (key, size, size)
+                    if tuple(pos) in taken:
+                        return 'position %s is given more than once' % pos
+                    if key != 'gold' and tuple(pos) == (size - 1, 0):
+                        return '%s can\'t sit on the start cell %s' % (key, pos)
+                    taken.add(tuple(pos))
+        return None
+    counts = [request.get(key, default) for key, default in zip(kinds, (1, 3, 1))]
+    if not all(is_int(count) and count >= 0 for count in counts):
+        return 'wumpus, pits and gold must be counts of at least 0 or lists of positions'
+    if sum(counts) > size * size - 3:
+        return '%d wumpus, pits and gold don\'t fit in the %d cells of a %dx%d world left after the start' % (sum(counts), size * size - 3, size, size)
+    return None
+
+def solve_request(request):
+    '''Builds and solves the world of one request, returning its outcome, the cells the agent moved through and timings.'''
+    result = {key : request[key] for key in ('id', 'line') if key in request}
+    if 'error' in request:
+        result['error'] = request['error']
+        return result
+    error = check_request(request)
+    if error is not None:
+        result['error'] = 'bad world: ' + error
+        return result
+    try:
+        start = perf_counter()
+        size = request.get('size', 4)
+        rng = random.Random(request.get('seed', 0))
+        world_type = CompactWorld if request.get('compact') else World
+        if any(isinstance(request.get(key), list) for key in ('wumpus', 'pits', 'gold')):
+            world = world_type(size, 0, 0, 0)
+            # positions given for some kinds only: counts for the others (say, from the defaults) place none
+            world.place_layout(*[[tuple(pos) for pos in request[key]] if isinstance(request.get(key), list) else [] for key in ('wumpus', 'pits', 'gold')])
+        else:
+            world = world_type(size, request.get('wumpus', 1), request.get('pits', 3), request.get('gold', 1),
+                               solvable=request.get('solvable', False), arrows=request.get('arrows', 1), rng=rng)
+        built = perf_counter()
+        recorder = PathRecorder()
+        outcome = Agent(world, request.get('arrows', 1), verbose=False, rng=rng, sink=recorder,
+                        max_steps=request.get('max_steps'), max_seconds=request.get('max_seconds')).run()
+        done = perf_counter()
+    except (KeyError, TypeError, ValueError, IndexError) as e:
+        result['error'] = 'bad world: ' + str(e)
+        return result
+    result.update(outcome.as_dict())
+    result['path'] = recorder.path
+    result['world_us'] = (built - start) * 1e6
+    result['solve_us'] = (done - built) * 1e6
+    return result
+
+def serve_stream(rfile, wfile, pool=None, defaults=None):
+    '''Solves every world read from rfile on the pool (in this process without one) and streams one JSON result line
+    per world to wfile, in request order, as soon as it is ready.'''
+    solve = pool.imap if pool is not None else map
+    for result in solve(solve_request, read_requests(rfile, defaults)):
+        wfile.write(json.dumps(result).encode() + b'\n')
+        wfile.flush()
+
+def serve(path=None, workers=None, defaults=None):
+    '''Runs the solver service on stdin/stdout, or on a UNIX socket at `path` where every connection gets its own
+    stream of requests and results. The worker pool is started once and stays warm for every request.'''
+    workers = workers or cpu_count()
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        if path is None:
+            serve_stream(sys.stdin.buffer, sys.stdout.buffer, pool, defaults)
+        else:
+            class Handler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    serve_stream(self.rfile, self.wfile, pool, defaults)
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                probe = socket.socket(socket.AF_UNIX)
+                try:
+                    probe.connect(path)
+                except ConnectionRefusedError: # left behind by a server that is gone
+                    os.unlink(path)
+                finally:
+                    probe.close()
+            with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+                server.daemon_threads = True
+                server.serve_forever()
+    finally:
+        if pool is not None:
+            pool.terminate()
 
-    if agent.do_actions():
-        print('Solved')
+BENCH_SIZES = (4, 8, 16, 32, 64, 128, 256, 512)
+BENCH_DENSITIES = (0.05, 0.15) # fraction of the cells holding a pit
+BENCH_EPISODE_SIZE = 32 # full episodes on larger boards explore for minutes, so only the decision loop is timed there
+BENCH_SECONDS = 0.2 # minimum time each metric of a case is measured over
+BENCH_FLOOR_US = 3.0 # slowdowns below this many microseconds are timer noise, however large in percent
+BENCH_METRICS = ('world_us', 'decision_us', 'episode_ms') + tuple(phase + '_us' for phase in Profiler.PHASES)
+
+def bench_case(size, density, seed=0, decisions=200, seconds=None):
+    '''Times one board size and hazard density on the worlds of seeds `seed`, `seed + 1`, ...
+    
+    Returns the mean microseconds to build a World, per decision of the agent (capped to `decisions` per world) and
+    per call of each profiled phase, plus the mean milliseconds of a full episode on boards up to BENCH_EPISODE_SIZE.
+    Each of the three is timed over as many passes over the worlds as fit in `seconds` (BENCH_SECONDS by default), so
+    small boards are averaged over enough work to be stable, and like timeit with the garbage collector off.'''
+    seconds = BENCH_SECONDS if seconds is None else seconds
+    gc.collect()
+    gc.disable()
+    try:
+        return time_case(size, density, seed, decisions, seconds)
+    finally:
+        gc.enable()
+
+def time_case(size, density, seed, decisions, seconds):
+    cells = size * size
+    cwumpus, cpits, cgold = max(1, cells // 64), max(1, round(density * cells)), 1
+    worlds = max(2, 1024 // cells)
+    result = dict()
+    
+    built, elapsed = 0, 0.0
+    while elapsed < seconds:
+        start = perf_counter()
+        for k in range(worlds):
+            World(size, cwumpus, cpits, cgold, rng=random.Random(seed + k))
+        elapsed += perf_counter() - start
+        built += worlds
+    result['world_us'] = elapsed / built * 1e6
+    
+    profiler = Profiler()
+    made, elapsed = 0, 0.0
+    while elapsed < seconds:
+        for k in range(worlds):
+            rng = random.Random(seed + k)
+            agent = Agent(World(size, cwumpus, cpits, cgold, rng=rng), verbose=False, rng=rng)
+            agent.instrument(profiler)
+            start = perf_counter()
+            try:
+                for _ in range(decisions):
+                    made += 1
+                    if agent.act():
+                        break
+            except EpisodeOver:
+                pass
+            elapsed += perf_counter() - start
+    result['decision_us'] = elapsed / made * 1e6
+    for phase, stats in profiler.stats()['phases'].items():
+        result[phase + '_us'] = stats['mean_us']
+    
+    if size <= BENCH_EPISODE_SIZE:
+        played, elapsed = 0, 0.0
+        while elapsed < seconds:
+            start = perf_counter()
+            for k in range(worlds):
+                play_episode(seed + k, size, cwumpus, cpits, cgold)
+            elapsed += perf_counter() - start
+            played += worlds
+        result['episode_ms'] = elapsed / played * 1000
+    return result
+
+def bench_cases(cases, repeats=5, seed=0):
+    '''Runs bench_case on every (size, density) case, keeping the median of `repeats` runs of each metric, by case name.
+    The runs go round every case in turn, so a burst of load on the machine costs each case at most one run.'''
+    runs = {case : list() for case in cases}
+    for _ in range(repeats):
+        for size, density in cases:
+            runs[size, density].append(bench_case(size, density, seed))
+    return {'%d@%g' % case : {metric : statistics.median(run[metric] for run in case_runs if metric in run) for metric in case_runs[0]}
+            for case, case_runs in runs.items()}
+
+def run_bench(sizes=BENCH_SIZES, densities=BENCH_DENSITIES, repeats=5, seed=0):
+    '''Runs bench_case over every size and density, keeping the median of `repeats` runs of each metric.'''
+    return {'sizes' : list(sizes), 'densities' : list(densities),
+            'results' : bench_cases([(size, density) for size in sizes for density in densities], repeats, seed)}
+
+def print_bench(bench):
+    '''Prints each metric as a curve over the board sizes, with the exponent of its growth in the board side.'''
+    sizes = bench['sizes']
+    print('%-22s %7s' % ('metric', 'density') + ''.join('%11d' % size for size in sizes) + '   exponent')
+    for metric in BENCH_METRICS:
+        for density in bench['densities']:
+            values = [bench['results']['%d@%g' % (size, density)].get(metric) for size in sizes]
+            points = [(size, value) for size, value in zip(sizes, values) if value]
+            if not points:
+                continue
+            exponent = ''
+            if len(points) > 1 and points[-1][0] != points[0][0]:
+                exponent = '%10.2f' % (math.log(points[-1][1] / points[0][1]) / math.log(points[-1][0] / points[0][0]))
+            print('%-22s %7g' % (metric, density) + ''.join('%11.1f' % value if value else '%11s' % '-' for value in values) + exponent)
+
+def bench_drift(bench, baseline):
+    '''Returns how much slower the machine runs than when the baseline was taken: the median ratio of every metric to
+    its baseline, and never below 1. Load on a shared machine slows every metric alike, so compare_bench discounts it;
+    a change that slowed every metric alike would look the same, which is why the drift is reported with the result.'''
+    ratios = [value / metrics_before[metric] for case, metrics in bench['results'].items()
+              for metrics_before in [baseline['results'].get(case, {})] for metric, value in metrics.items() if metrics_before.get(metric)]
+    return max(1.0, statistics.median(ratios)) if ratios else 1.0
+
+def compare_bench(bench, baseline, threshold=25.0):
+    '''Returns the metrics that got more than `threshold` percent and more than BENCH_FLOOR_US slower than in the
+    baseline, after discounting the machine's drift, as (case, metric, baseline, now).'''
+    drift = bench_drift(bench, baseline)
+    regressions = list()
+    for case, metrics in bench['results'].items():
+        for metric, value in metrics.items():
+            before = baseline['results'].get(case, {}).get(metric)
+            floor = BENCH_FLOOR_US / 1000 if metric.endswith('_ms') else BENCH_FLOOR_US
+            if before and value > before * drift * (1 + threshold / 100) and value - before * drift > floor:
+                regressions.append((case, metric, before, value))
+    return regressions
+
+def gc_pressure(episodes, seed=0, **params):
+    '''Plays `episodes` seeded episodes in this process and returns the garbage collections they set off per episode.
+    
+    CPython collects the youngest generation every few hundred container objects allocated and not yet freed, so
+    collections per episode track the objects the agent and its world keep alive, and the time spent collecting is what
+    they cost. The episodes are then replayed under tracemalloc for the peak memory each one allocates, which also counts
+    short-lived objects such as search nodes. `params` are passed on to play_episode.'''
+    spent = [0.0, 0.0] # seconds collecting, start of the running collection
+    def timer(phase, info):
+        if phase == 'start':
+            spent[1] = perf_counter()
+        else:
+            spent[0] += perf_counter() - spent[1]
+    
+    gc.collect()
+    before = [stats['collections'] for stats in gc.get_stats()]
+    gc.callbacks.append(timer)
+    start = perf_counter()
+    try:
+        for k in range(seed, seed + episodes):
+            play_episode(k, **params)
+    finally:
+        gc.callbacks.remove(timer)
+    elapsed = perf_counter() - start
+    after = [stats['collections'] for stats in gc.get_stats()]
+    
+    result = {'episodes' : episodes, 'episode_us' : elapsed / episodes * 1e6, 'gc_us' : spent[0] / episodes * 1e6}
+    for generation, (b, a) in enumerate(zip(before, after)):
+        result['gen%d' % generation] = (a - b) / episodes
+    
+    peak = 0
+    tracemalloc.start()
+    try:
+        for k in range(seed, seed + episodes):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            play_episode(k, **params)
+            peak += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    result['peak_kb'] = peak / episodes / 1024
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Wumpus World solver.')
+    parser.add_argument('--batch', type=int, metavar='N', help='play N headless episodes on seeded random worlds and report the solve rate')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first episode in a batch (index of the first world with --corpus)')
+    parser.add_argument('--corpus', metavar='PATH', help='play the worlds stored in a corpus file instead of generating them (all of them unless --batch is given)')
+    parser.add_argument('--write-corpus', metavar='PATH', help='write N (from --batch) seeded worlds to a corpus file and exit')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (defaults to every core)')
+    parser.add_argument('--shard-size', type=int, default=1000, help='episodes handed to a worker at a time')
+    parser.add_argument('--size', type=int, default=4, help='world dimensions')
+    parser.add_argument('--wumpus', type=int, default=1, help='number of wumpus')
+    parser.add_argument('--pits', type=int, default=3, help='number of pits')
+    parser.add_argument('--gold', type=int, default=1, help='number of gold')
+    parser.add_argument('--arrows', type=int, default=1, help='number of arrows the agent carries')
+    parser.add_argument('--max-steps', type=int, metavar='N', help='give an episode up as stuck after N moves')
+    parser.add_argument('--max-seconds', type=float, metavar='S', help='give an episode up as stuck after S seconds of wall time')
+    parser.add_argument('--delay', type=float, default=1.0, help='seconds to pause after each move when watching a single run')
+    parser.add_argument('--compact', action='store_true', help='store generated worlds in the compact array-backed grid')
+    parser.add_argument('--solvable', action='store_true', help='only play worlds where the gold can be reached, possibly by shooting a wumpus')
+    parser.add_argument('--profile', metavar='PATH', help='record per-phase timings and search counters of a batch and write them as JSON to PATH (- for stdout)')
+    parser.add_argument('--results', metavar='PATH', help='stream per-episode records of a batch to a columnar results file at PATH, resuming from it if it exists')
+    parser.add_argument('--cprofile', metavar='PATH', help='run a batch in this process under cProfile and dump the stats to PATH')
+    parser.add_argument('--bulk', action='store_true', help='pre-generate each shard\'s worlds in one vectorized call (requires NumPy)')
+    parser.add_argument('--lockstep', type=int, metavar='K', help='step K agents together with the vectorized engine under a random policy and report agent-steps/sec (requires NumPy)')
+    parser.add_argument('--steps', type=int, default=1000, help='rounds to step the agents for with --lockstep or --check-engines')
+    parser.add_argument('--check-engines', type=int, metavar='K', help='play the same random actions on K worlds for --steps rounds through the Agent, Lockstep and WumpusEnv and exit with status 1 if they disagree (requires NumPy)')
+    parser.add_argument('--env-steps', type=int, metavar='N', help='play N random actions through the step-by-step WumpusEnv and report steps/sec')
+    parser.add_argument('--bench', action='store_true', help='time world construction, the phases of the decision loop and full episodes across board sizes and print their scaling')
+    parser.add_argument('--bench-sizes', type=int, nargs='+', default=list(BENCH_SIZES), metavar='SIZE', help='board sizes to benchmark')
+    parser.add_argument('--bench-save', metavar='PATH', help='store the benchmark results as a JSON baseline')
+    parser.add_argument('--bench-baseline', metavar='PATH', help='compare the benchmark against a stored baseline and exit with status 1 on regressions')
+    parser.add_argument('--bench-threshold', type=float, default=25.0, help='percent slowdown over the baseline counted as a regression')
+    parser.add_argument('--gc-bench', action='store_true', help='play N (from --batch, 2000 by default) episodes in this process and report the garbage collections and collection time per episode')
+    parser.add_argument('--serve', action='store_true', help='keep a warm worker pool solving the worlds sent on stdin as JSON lines or a corpus stream, writing JSON results to stdout')
+    parser.add_argument('--socket', metavar='PATH', help='with --serve, listen on a UNIX socket at PATH instead of stdin')
+    parser.add_argument('--lookahead', type=float, nargs='+', metavar='MS', help='plan every decision of a batch with Monte Carlo rollouts under a budget of MS milliseconds; several budgets are compared')
+    parser.add_argument('--horizon', type=int, default=0, help='decisions of the plain heuristic simulated after each candidate action with --lookahead')
+    args = parser.parse_args()
+    if args.results and args.lookahead and len(args.lookahead) > 1:
+        parser.error('--results takes a single --lookahead budget')
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    
+    if args.bench:
+        bench = run_bench(args.bench_sizes, seed=args.seed)
+        print_bench(bench)
+        if args.bench_save:
+            with open(args.bench_save, 'w') as f:
+                json.dump(bench, f, indent=2)
+        if args.bench_baseline:
+            with open(args.bench_baseline) as f:
+                baseline = json.load(f)
+            regressions = compare_bench(bench, baseline, args.bench_threshold)
+            if regressions: # load on the machine can push a case over, so the cases that regressed are timed again first
+                cases = sorted({(int(case.split('@')[0]), float(case.split('@')[1])) for case, _, _, _ in regressions})
+                bench['results'].update(bench_cases(cases, seed=args.seed))
+                regressions = compare_bench(bench, baseline, args.bench_threshold)
+            print('Machine drift: %.2fx slower than the baseline overall, discounted' % bench_drift(bench, baseline))
+            for case, metric, before, now in regressions:
+                print('REGRESSION %s %s: %.1f -> %.1f (+%.0f%%)' % (case, metric, before, now, (now / before - 1) * 100))
+            if regressions:
+                sys.exit(1)
+            print('No regressions over %g%%' % args.bench_threshold)
+    elif args.gc_bench:
+        totals = gc_pressure(args.batch or 2000, args.seed, dimensions=args.size, cwumpus=args.wumpus, cpits=args.pits, cgold=args.gold,
+                             arrows=args.arrows, compact=args.compact, solvable=args.solvable)
+        print('GC pressure: %d episodes, %.1f us per episode of which %.1f us collecting' % (totals['episodes'], totals['episode_us'], totals['gc_us']))
+        print('Collections per episode: gen0 %.4f  gen1 %.4f  gen2 %.5f' % (totals['gen0'], totals['gen1'], totals['gen2']))
+        print('Peak memory allocated per episode: %.1f KB' % totals['peak_kb'])
+    elif args.serve:
+        serve(args.socket, args.workers, dict(size=args.size, wumpus=args.wumpus, pits=args.pits, gold=args.gold, arrows=args.arrows,
+                                              compact=args.compact, solvable=args.solvable, max_steps=args.max_steps, max_seconds=args.max_seconds))
+    elif args.lockstep:
+        totals = run_lockstep(args.lockstep, args.steps, args.size, args.wumpus, args.pits, args.gold, args.arrows, seed=args.seed)
+        print('Lockstep: %d agents x %d steps in %.2fs (%.0f agent-steps/sec)' % (totals['agents'], totals['steps'], totals['seconds'], totals['steps_per_sec']))
+        print('Died: %d  Wumpus killed: %d  Gold grabbed: %d  All gold: %d' % (totals['died'], totals['kills'], totals['gold'], totals['all_gold']))
+    elif args.check_engines:
+        mismatches = check_engines(args.check_engines, args.steps, args.size, args.wumpus, args.pits, args.gold, args.arrows, seed=args.seed)
+        for t, k, engine in mismatches[:10]:
+            print('MISMATCH round %d agent %d: %s disagrees with the Agent' % (t, k, engine))
+        if mismatches:
+            sys.exit(1)
+        print('Engines agree: %d agents x %d steps' % (args.check_engines, args.steps))
+    elif args.env_steps:
+        totals = run_env(args.env_steps, args.size, args.wumpus, args.pits, args.gold, args.arrows, seed=args.seed)
+        print('Env: %d steps over %d episodes in %.2fs (%.0f steps/sec)' % (totals['steps'], totals['episodes'], totals['seconds'], totals['steps_per_sec']))
+    elif args.write_corpus:
+        write_corpus(args.write_corpus, args.batch or 0, args.size, args.wumpus, args.pits, args.gold, seed=args.seed,
+                     solvable=args.solvable, arrows=args.arrows, bulk=args.bulk, shard_size=args.shard_size)
+    elif args.corpus or args.batch is not None:
+        if args.corpus:
+            episodes = args.batch if args.batch is not None else len(open_corpus(args.corpus)) - args.seed
+            params = dict(arrows=args.arrows, compact=args.compact, corpus=args.corpus)
+        else:
+            episodes = args.batch
+            params = dict(dimensions=args.size, cwumpus=args.wumpus, cpits=args.pits, cgold=args.gold, arrows=args.arrows,
+                          compact=args.compact, bulk=args.bulk, solvable=args.solvable)
+        params.update(max_steps=args.max_steps, max_seconds=args.max_seconds)
+        
+        workers = args.workers
+        if args.cprofile:
+            workers = 1 # cProfile only sees the current process
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            if args.lookahead:
+                results = list()
+                for budget in args.lookahead:
+                    results.append(run_batch(episodes, seed=args.seed, workers=workers, shard_size=args.shard_size, profile=bool(args.profile),
+                                             lookahead=budget, horizon=args.horizon, store=args.results, **params))
+                    print_report(results[-1])
+                totals = results[-1]
+            else:
+                totals = run_batch(episodes, seed=args.seed, workers=workers, shard_size=args.shard_size, profile=bool(args.profile),
+                                   store=args.results, **params)
+        except ValueError as e: # a results file of another run, or worlds that can't be built
+            sys.exit('error: ' + str(e))
+        if args.cprofile:
+            profile.disable()
+            profile.dump_stats(args.cprofile)
+        
+        if args.lookahead:
+            if len(args.lookahead) > 1:
+                print_tradeoff(args.lookahead, results)
+        else:
+            print_report(totals)
+        if args.profile == '-':
+            print(totals['profile'].to_json())
+        elif args.profile:
+            with open(args.profile, 'w') as f:
+                f.write(totals['profile'].to_json())
     else:
-        print('Died')
+        world = (CompactWorld if args.compact else World)(args.size, args.wumpus, args.pits, args.gold, world_lst=lst)
+        agent = Agent(world, args.arrows, sink=ThrottledRenderer(world, delay=args.delay))
+        
+        print(world)
+        
+        print(agent.run().result.capitalize())